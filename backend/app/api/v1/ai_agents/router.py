@@ -1,17 +1,29 @@
-from typing import Any
-import io
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable
+import asyncio
+import atexit
+import functools
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 from fastapi import APIRouter, Depends, File, UploadFile, Form, HTTPException
 from fastapi.responses import StreamingResponse
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import Runnable, RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from typing import Dict
-import pypdf
-import docx
+import pymupdf
+from lxml import etree
 import os
+import queue
+import shutil
 import tempfile
+import threading
+import zipfile
 
 
 
@@ -26,6 +38,8 @@ if os.name == 'nt':
         pass
 
 from app.core.ai.llm import get_llm
+from app.core.pdf import extract_pdf_pages
+from app.core.process_pool import discard_process_pool, get_process_pool
 from app.schemas.ai import (
     ChatRequest, 
     ChatResponse, 
@@ -35,30 +49,147 @@ from app.schemas.ai import (
     PersonInfo
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# ============================================================
+# 链构建 (首次使用时构建一次，之后跨请求复用)
+# ============================================================
+
+# 翻译提示词，/translate 与 /translate-file 共用
+# 固定指令放在最前面，变量只出现在末尾，保证请求前缀逐字节一致以命中服务端的提示词缓存
+_TRANSLATE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是一位精通多种语言的翻译官。请将用户发送的全部内容翻译成{target_language}，只输出译文。"),
+    ("user", "{text}")
+])
+
+
+@functools.cache
+def _get_chat_chain() -> Runnable:
+    """基础对话链：提示词 -> 模型 -> 解析为字符串"""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "你是一个友好的助手，请回答用户的问题"),
+        ("user", "{question}")
+    ])
+    return prompt | get_llm() | StrOutputParser()
+
+
+@functools.cache
+def _get_streaming_chat_chain() -> Runnable:
+    """流式对话链"""
+    prompt = ChatPromptTemplate.from_template("{question}")
+    return prompt | get_llm(streaming=True) | StrOutputParser()
+
+
+@functools.cache
+def _get_translate_chain() -> Runnable:
+    """流式翻译链"""
+    return _TRANSLATE_PROMPT | get_llm(streaming=True) | StrOutputParser()
+
+
+async def _batched(
+    stream: AsyncIterator[str], max_chars: int = 64, max_delay: float = 0.05
+) -> AsyncIterator[str]:
+    """
+    合并流式输出的细碎片段，减少逐 token 发送带来的 HTTP 分帧与 socket 写入次数。
+
+    缓冲内容达到 max_chars 个字符，或第一段缓冲内容等待超过 max_delay 秒时输出一次。
+    """
+    loop = asyncio.get_running_loop()
+    iterator = aiter(stream)
+    buffer: list[str] = []
+    size = 0
+    deadline = 0.0
+    pending: asyncio.Future[str] | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            timeout = max(deadline - loop.time(), 0) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # 时间窗口到期，先输出已缓冲的内容，继续等待下一段
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                continue
+
+            next_chunk, pending = pending, None
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= max_chars:
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+# 翻译结果缓存 (LRU)：(原文哈希, 目标语言) -> 完整译文
+_TRANSLATION_CACHE_MAX_SIZE = 256
+_translation_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+
+async def _stream_translation(text: str, target_language: str) -> AsyncIterator[str]:
+    """流式翻译，命中缓存时直接返回完整译文，否则边生成边输出并在完成后写入缓存"""
+    key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), target_language)
+    cached = _translation_cache.get(key)
+    if cached is not None:
+        _translation_cache.move_to_end(key)
+        logger.debug("翻译缓存命中 (target_language=%s)", target_language)
+        yield cached
+        return
+
+    logger.debug("翻译缓存未命中 (target_language=%s)", target_language)
+    chunks: list[str] = []
+    async for chunk in _get_translate_chain().astream({
+        "text": text,
+        "target_language": target_language
+    }):
+        chunks.append(chunk)
+        yield chunk
+
+    # 只缓存完整生成的译文 (客户端中途断开时不会执行到这里)
+    _translation_cache[key] = "".join(chunks)
+    if len(_translation_cache) > _TRANSLATION_CACHE_MAX_SIZE:
+        _translation_cache.popitem(last=False)
+
+
+# 结构化提取的解析器与提示词：格式化指令需要把 Pydantic schema 序列化为 JSON，只在模块加载时计算一次
+_PERSON_PARSER = PydanticOutputParser(pydantic_object=PersonInfo)
+_PERSON_FORMAT_INSTRUCTIONS = _PERSON_PARSER.get_format_instructions()
+_EXTRACT_PROMPT = ChatPromptTemplate.from_template(
+    "从以下文本中提取人物信息。\n{format_instructions}\n文本内容：{text}"
+).partial(format_instructions=_PERSON_FORMAT_INSTRUCTIONS)
+
+
+@functools.cache
+def _get_extract_chain() -> Runnable:
+    """结构化信息提取链"""
+    return _EXTRACT_PROMPT | get_llm() | _PERSON_PARSER
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def basic_chat(request: ChatRequest) -> Any:
     """
     1. 基础对话演示
     展示最简单的 LangChain 用法：Prompt -> LLM -> String
     """
-    # llm = get_llm()
-    llm = get_llm()
-    # 定义提示词模板
-    # prompt = ChatPromptTemplate.from_template("你是一个友好的助手，请回答用户的问题：{question}")
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "你是一个友好的助手，请回答用户的问题"),
-        ("user", "{question}")
-    ])
-    
-    # 使用 LCEL (LangChain Expression Language) 构建链
+    # 使用 LCEL (LangChain Expression Language) 构建的链
     # 逻辑：提示词 -> 模型 -> 解析为字符串
-    # chain = prompt | llm | StrOutputParser()
-    chain = prompt | llm | StrOutputParser()
+    chain = _get_chat_chain()
     
-    # result = await chain.ainvoke({"question": request.message})
-    # return ChatResponse(response=result)
     result = await chain.ainvoke({"question": request.message})
     return ChatResponse(response=result)
 
@@ -68,12 +199,10 @@ async def streaming_chat(request: ChatRequest):
     2. 流式响应演示
     展示如何通过控制器将 LLM 的生成过程实时推送给前端。
     """
-    llm = get_llm(streaming=True)
-    prompt = ChatPromptTemplate.from_template("{question}")
-    chain = prompt | llm | StrOutputParser()
+    chain = _get_streaming_chat_chain()
 
     async def event_generator():
-        async for chunk in chain.astream({"question": request.message}):
+        async for chunk in _batched(chain.astream({"question": request.message})):
             yield chunk
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -84,19 +213,8 @@ async def translate_text(request: TranslationRequest) -> StreamingResponse:
     3. LCEL 链式调用演示 (流式输出)
     展示如何构建一个稍微复杂的、带有固定逻辑的链，并以流式输出结果。
     """
-    llm = get_llm(streaming=True)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "你是一位精通多种语言的翻译官。"),
-        ("user", "请将以下内容翻译成{target_language}：\n\n{text}")
-    ])
-    
-    chain = prompt | llm | StrOutputParser()
-    
     async def event_generator():
-        async for chunk in chain.astream({
-            "text": request.text,
-            "target_language": request.target_language
-        }):
+        async for chunk in _batched(_stream_translation(request.text, request.target_language)):
             yield chunk
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -107,20 +225,241 @@ async def extract_info(request: ExtractionRequest) -> Any:
     4. 结构化输出演示 (Output Parser)
     展示如何强制 LLM 返回符合 Pydantic 模型的数据格式。
     """
-    llm = get_llm()
-    # 初始化解析器
-    parser = PydanticOutputParser(pydantic_object=PersonInfo)
-    
-    # 在提示词中注入格式化指令
-    prompt = ChatPromptTemplate.from_template(
-        "从以下文本中提取人物信息。\n{format_instructions}\n文本内容：{text}"
+    return await _get_extract_chain().ainvoke({"text": request.text})
+
+# ============================================================
+# 文件解析 (同步函数，由 translate_file 放到线程池 / 专用线程中执行)
+# ============================================================
+
+# COM 的 CoInitialize 是线程级别的 (STA)，且 Word 冷启动耗时数秒：
+# 由单个专用线程持有常驻的 Word 实例，通过队列串行处理 .doc 解析任务
+_word_queue: "queue.Queue[tuple[BinaryIO, Future[str]] | None]" = queue.Queue()
+_word_thread: threading.Thread | None = None
+_word_thread_lock = threading.Lock()
+
+_DOCX_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_PARAGRAPH_TAG = f"{_DOCX_NAMESPACE}p"
+_DOCX_TEXT_TAG = f"{_DOCX_NAMESPACE}t"
+
+# pdftotext (poppler) 存在时优先使用，比 Python 解析库快得多
+_PDFTOTEXT_PATH = shutil.which("pdftotext")
+# pdftotext 单个文件的最长执行时间 (秒)
+_PDFTOTEXT_TIMEOUT = 30.0
+
+# 超过该页数的 PDF 按页段拆分到多个进程并行提取，页数较少时进程调度开销得不偿失
+_PDF_PARALLEL_MIN_PAGES = 20
+
+# PyMuPDF 不支持多线程：并发的 /translate-file 请求在线程池中同时调用可能返回错误结果甚至使进程崩溃，
+# 同一进程内的 PyMuPDF 调用通过该锁串行执行 (大文件拆分到进程池的部分不受影响)
+_pymupdf_lock = threading.Lock()
+
+
+def _parse_pdf(content: bytes) -> str:
+    """提取 PDF 文本"""
+    # PyMuPDF 的文本提取由 C 实现，比 pypdf 快一个数量级
+    with _pymupdf_lock:
+        pdf_doc = pymupdf.open(stream=content, filetype="pdf")
+        try:
+            page_count = pdf_doc.page_count
+            if page_count <= _PDF_PARALLEL_MIN_PAGES:
+                return "\n".join(page.get_text("text") for page in pdf_doc)
+        finally:
+            pdf_doc.close()
+
+    # 大文件：每个进程负责一段连续页，减少 PDF 字节在进程间的重复传输
+    workers = os.cpu_count() or 1
+    step = -(-page_count // workers)
+    starts = range(0, page_count, step)
+    stops = [min(start + step, page_count) for start in starts]
+    pool = get_process_pool()
+    try:
+        return "\n".join(pool.map(extract_pdf_pages, repeat(content), starts, stops))
+    except BrokenProcessPool:
+        # 子进程崩溃后进程池不可再用，丢弃后由下次调用重新创建
+        discard_process_pool(pool)
+        raise
+
+
+async def _parse_pdf_with_pdftotext(content: bytes) -> str | None:
+    """通过 poppler 的 pdftotext 子进程提取 PDF 文本，失败时返回 None"""
+    proc = await asyncio.create_subprocess_exec(
+        _PDFTOTEXT_PATH, "-q", "-enc", "UTF-8", "-", "-",
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
     )
-    # 注入解析器要求的指令
-    prompt = prompt.partial(format_instructions=parser.get_format_instructions())
-    
-    chain = prompt | llm | parser
-    
-    return await chain.ainvoke({"text": request.text})
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(content), timeout=_PDFTOTEXT_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"pdftotext 超过 {_PDFTOTEXT_TIMEOUT} 秒未完成，改用 PyMuPDF 解析")
+        return None
+    finally:
+        # 超时或请求被取消时结束子进程，避免遗留卡住的 pdftotext
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+    if proc.returncode != 0:
+        return None
+    return stdout.decode("utf-8", "replace")
+
+
+def _parse_docx(file_obj: BinaryIO) -> str:
+    """提取 Word (.docx) 文本"""
+    # .docx 本质是 zip 包，直接流式解析 word/document.xml 中的 <w:t>，
+    # 无需像 python-docx 那样构建完整的文档对象模型
+    chunks: list[str] = []
+    with zipfile.ZipFile(file_obj) as zf, zf.open("word/document.xml") as f:
+        # 上传的文档不可信：不解析实体、不访问网络，防止 XXE 读取服务器文件
+        for _, el in etree.iterparse(
+            f,
+            tag=(_DOCX_PARAGRAPH_TAG, _DOCX_TEXT_TAG),
+            resolve_entities=False,
+            no_network=True,
+        ):
+            if el.tag == _DOCX_TEXT_TAG:
+                chunks.append(el.text or "")
+            else:
+                chunks.append("\n")
+            el.clear()
+    return "".join(chunks)
+
+
+def _parse_doc(word: Any, file_obj: BinaryIO) -> str:
+    """使用已启动的 Word 实例提取 .doc 文本 (在 Word 专用线程中执行)"""
+    # 保存到临时文件
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".doc") as tmp:
+        shutil.copyfileobj(file_obj, tmp)
+        tmp_path = tmp.name
+        # 重要：必须关闭文件，否则 Word 无法打开
+        tmp.close()
+
+    try:
+        doc = word.Documents.Open(os.path.abspath(tmp_path))
+        try:
+            return doc.Content.Text
+        finally:
+            doc.Close()
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _word_worker() -> None:
+    """Word 专用线程：COM 与 Word 实例只初始化一次，循环处理队列中的解析任务"""
+    try:
+        pythoncom_module.CoInitialize()
+        word = None
+        try:
+            while True:
+                job = _word_queue.get()
+                if job is None:
+                    break
+                file_obj, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if word is None:
+                        word = win32com_client.Dispatch("Word.Application")
+                        word.Visible = False
+                    future.set_result(_parse_doc(word, file_obj))
+                except Exception as e:
+                    # Word 进程可能已异常退出，丢弃当前实例，下一个任务重新启动
+                    if word is not None:
+                        try:
+                            word.Quit()
+                        except Exception:
+                            pass
+                        word = None
+                    future.set_exception(e)
+        finally:
+            if word is not None:
+                try:
+                    word.Quit()
+                except Exception:
+                    pass
+            pythoncom_module.CoUninitialize()
+    except Exception as e:
+        logger.error(f"Word 工作线程异常退出: {e}")
+    finally:
+        _on_word_worker_exit()
+
+
+def _on_word_worker_exit() -> None:
+    """Word 线程退出时注销自身，并让队列中剩余的任务失败，避免调用方一直等待"""
+    global _word_thread
+    with _word_thread_lock:
+        if _word_thread is threading.current_thread():
+            _word_thread = None
+        while True:
+            try:
+                job = _word_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job[1].set_running_or_notify_cancel():
+                job[1].set_exception(RuntimeError("Word 解析线程已退出，请重试"))
+
+
+def _submit_word_job(file_obj: BinaryIO) -> "Future[str]":
+    """提交 .doc 解析任务，Word 专用线程未启动或已退出时 (重新) 启动"""
+    global _word_thread
+    future: Future[str] = Future()
+    # 在锁内入队：与 _on_word_worker_exit 互斥，任务要么由存活的线程处理，要么由新线程处理
+    with _word_thread_lock:
+        if _word_thread is None or not _word_thread.is_alive():
+            _word_thread = threading.Thread(target=_word_worker, name="word-com", daemon=True)
+            _word_thread.start()
+        _word_queue.put((file_obj, future))
+    return future
+
+
+@atexit.register
+def _shutdown_word_worker() -> None:
+    """进程退出时关闭 Word 实例"""
+    thread = _word_thread
+    if thread is not None and thread.is_alive():
+        _word_queue.put(None)
+        thread.join(timeout=10)
+
+
+# ============================================================
+# 按扩展名分发的文本提取 (解析属于阻塞操作，均不在事件循环线程中执行)
+# 除 PDF 外，解析器直接读取上传的临时文件 (file.file)，避免整个文件再复制一份到内存
+# ============================================================
+
+async def _extract_pdf_text(file: UploadFile) -> str:
+    # pdftotext 与 PyMuPDF 都需要完整的字节内容
+    content = await file.read()
+    text = ""
+    if _PDFTOTEXT_PATH:
+        text = await _parse_pdf_with_pdftotext(content) or ""
+    if not text.strip():
+        text = await asyncio.to_thread(_parse_pdf, content)
+    return text
+
+
+async def _extract_docx_text(file: UploadFile) -> str:
+    return await asyncio.to_thread(_parse_docx, file.file)
+
+
+async def _extract_doc_text(file: UploadFile) -> str:
+    # 使用 pywin32 处理 .doc (仅限 Windows)
+    if os.name != 'nt':
+        raise HTTPException(status_code=400, detail="当前系统不支持 .doc 格式，请在 Windows 环境下运行或使用 .docx 格式。")
+    # 检查模块是否存在
+    if not pythoncom_module or not win32com_client:
+        raise HTTPException(status_code=500, detail="Word 解析引擎 (pywin32) 未能正确加载，请联系管理员。")
+    try:
+        return await asyncio.wrap_future(_submit_word_job(file.file))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Word 解析失败 (请确保已安装 Microsoft Word): {str(e)}")
+
+
+_EXTENSION_HANDLERS: Dict[str, Callable[[UploadFile], Awaitable[str]]] = {
+    ".pdf": _extract_pdf_text,
+    ".docx": _extract_docx_text,
+    ".doc": _extract_doc_text,
+}
+
 
 @router.post("/translate-file")
 async def translate_file(
@@ -131,61 +470,13 @@ async def translate_file(
     5. 文件翻译演示
     支持 PDF 和 Word 文件上传，提取文本后进行流式翻译。
     """
-    content = await file.read()
-    text = ""
-    
-    try:
-        if file.filename.lower().endswith(".pdf"):
-            pdf_reader = pypdf.PdfReader(io.BytesIO(content))
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        elif file.filename.lower().endswith(".docx"):
-            doc = docx.Document(io.BytesIO(content))
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        elif file.filename.lower().endswith(".doc"):
-            # 使用 pywin32 处理 .doc (仅限 Windows)
-            if os.name != 'nt':
-                raise HTTPException(status_code=400, detail="当前系统不支持 .doc 格式，请在 Windows 环境下运行或使用 .docx 格式。")
-            
-            # 保存到临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".doc") as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-                # 重要：必须关闭文件，否则 Word 无法打开
-                tmp.close()
-            
-            try:
-                # 检查模块是否存在
-                if not pythoncom_module or not win32com_client:
-                    raise HTTPException(status_code=500, detail="Word 解析引擎 (pywin32) 未能正确加载，请联系管理员。")
+    ext = os.path.splitext(file.filename)[1].lower()
+    extract_text = _EXTENSION_HANDLERS.get(ext)
+    if extract_text is None:
+        raise HTTPException(status_code=400, detail="不支持的文件格式。请上传 PDF, Word (.docx) 或 Word (.doc) 文件。")
 
-                # 初始化 COM 组件
-                pythoncom_module.CoInitialize()
-                word = None
-                try:
-                    word = win32com_client.Dispatch("Word.Application")
-                    word.Visible = False
-                    abs_path = os.path.abspath(tmp_path)
-                    doc = word.Documents.Open(abs_path)
-                    try:
-                        text = doc.Content.Text
-                    finally:
-                        doc.Close()
-                finally:
-                    if word:
-                        word.Quit()
-            except Exception as e:
-                if isinstance(e, HTTPException):
-                    raise
-                raise HTTPException(status_code=500, detail=f"Word 解析失败 (请确保已安装 Microsoft Word): {str(e)}")
-            finally:
-                if pythoncom_module:
-                    pythoncom_module.CoUninitialize()
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-        else:
-            raise HTTPException(status_code=400, detail="不支持的文件格式。请上传 PDF, Word (.docx) 或 Word (.doc) 文件。")
+    try:
+        text = await extract_text(file)
     except HTTPException:
         raise
     except Exception as e:
@@ -194,21 +485,10 @@ async def translate_file(
     if not text.strip():
         raise HTTPException(status_code=400, detail="未能从文件中提取到有效文本。")
 
-    llm = get_llm(streaming=True)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "你是一位精通多种语言的翻译官。"),
-        ("user", "请将以下内容翻译成{target_language}：\n\n{text}")
-    ])
-    
-    chain = prompt | llm | StrOutputParser()
-    
     async def event_generator():
         # 先发送文件名作为确认消息（可选）
         # yield f"--- 文件: {file.filename} ---\n\n"
-        async for chunk in chain.astream({
-            "text": text,
-            "target_language": target_language
-        }):
+        async for chunk in _batched(_stream_translation(text, target_language)):
             yield chunk
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
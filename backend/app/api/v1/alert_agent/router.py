@@ -2,7 +2,6 @@
 报警 Agent 路由
 实现观察-思考-行动的智能体循环，自动处理系统报警
 """
-import os
 import logging
 from typing import Any, Dict, List
 from fastapi import APIRouter, HTTPException
@@ -13,45 +12,16 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from langchain.agents import create_agent
 
-# Milvus 环境变量清理（与 llamaindex/router.py 保持一致）
-if "MILVUS_URI" in os.environ:
-    del os.environ["MILVUS_URI"]
-
-from llama_index.core import VectorStoreIndex, StorageContext
-from llama_index.vector_stores.milvus import MilvusVectorStore
+from llama_index.core import QueryBundle, Settings as LlamaSettings
 
 from app.core.ai.llm import get_llm
-from app.core.config import settings
+from app.core.ai.query_cache import QueryCache
+from app.core.ai.vector_store import aretrieve
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# ============================================================
-# Milvus 辅助函数
-# ============================================================
-
-def get_milvus_vector_store() -> MilvusVectorStore:
-    """获取 Milvus 向量存储实例"""
-    if settings.MILVUS_URI:
-        return MilvusVectorStore(
-            uri=settings.MILVUS_URI,
-            token=settings.MILVUS_TOKEN,
-            collection_name=settings.MILVUS_COLLECTION,
-            dim=settings.LLAMAINDEX_EMBEDDING_DIM
-        )
-    elif settings.MILVUS_HOST:
-        return MilvusVectorStore(
-            uri=f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
-            user=settings.MILVUS_USER,
-            password=settings.MILVUS_PASSWORD,
-            collection_name=settings.MILVUS_COLLECTION,
-            dim=settings.LLAMAINDEX_EMBEDDING_DIM,
-            overwrite=False
-        )
-    else:
-        raise HTTPException(status_code=500, detail="未配置 Milvus 连接信息")
-
 # ============================================================
 # 工具函数定义
 # ============================================================
@@ -78,6 +48,24 @@ LOCATION_SYNONYMS = {
     "会议室": ["会议室", "会议厅", "洽谈室"],
 }
 
+# 同义词 -> 标准地点名的反向索引，模块加载时构建一次，查询为 O(1)
+SYNONYM_TO_LOCATION = {
+    synonym: standard_name
+    for standard_name, synonyms in LOCATION_SYNONYMS.items()
+    for synonym in synonyms
+}
+
+# 按长度降序排列的同义词，匹配时优先命中更具体的名称 (如"服务器机房"先于"机房")
+_SYNONYMS_BY_LENGTH = sorted(SYNONYM_TO_LOCATION, key=len, reverse=True)
+
+
+def detect_location(alert_message: str) -> str | None:
+    """在报警文本中查找已知地点，返回标准地点名，未找到时返回 None"""
+    for synonym in _SYNONYMS_BY_LENGTH:
+        if synonym in alert_message:
+            return SYNONYM_TO_LOCATION[synonym]
+    return None
+
 
 @tool
 def get_contact_phone(location: str) -> str:
@@ -99,17 +87,60 @@ def get_contact_phone(location: str) -> str:
         return CONTACT_PHONE_MAP[location]
 
     # 尝试同义词匹配
-    for standard_name, synonyms in LOCATION_SYNONYMS.items():
-        if location in synonyms:
-            return CONTACT_PHONE_MAP[standard_name]
+    standard_name = SYNONYM_TO_LOCATION.get(location)
+    if standard_name:
+        return CONTACT_PHONE_MAP[standard_name]
 
     # 未找到对应负责人
     available_locations = ", ".join(CONTACT_PHONE_MAP.keys())
     return f"未找到地点 '{location}' 的负责人信息。可用地点: {available_locations}"
 
 
+# 应急手册语义缓存：如"仓库着火"/"仓库失火了"这类语义相同的查询复用同一次检索结果
+# 索引数据写入或删除时由 llamaindex 路由统一失效；失效只作用于处理该请求的 worker 进程，
+# 因此同样设置 TTL，其他进程中的过期结果最多保留 5 分钟
+_manuals_cache = QueryCache(max_size=128, ttl=300.0, similarity_threshold=0.92)
+
+
+async def _retrieve_emergency_manuals(query: str, top_k: int = 3) -> str | None:
+    """检索应急手册并整理为文本，未找到时返回 None，查询失败时抛出异常"""
+    # 相同或语义相近的报警直接复用缓存的检索结果，跳过 Milvus 查询
+    cached = _manuals_cache.get(top_k, query)
+    if cached is not None:
+        return cached
+    query_embedding = await LlamaSettings.embed_model.aget_query_embedding(query)
+    cached = _manuals_cache.get_similar(top_k, query_embedding)
+    if cached is not None:
+        logger.info(f"应急手册语义缓存命中: {query}")
+        return cached
+
+    # 使用缓存的 retriever 检索相关文档 (异步接口，不阻塞事件循环)
+    # 复用已计算的查询向量，避免 retriever 再次请求 embedding
+    nodes = await aretrieve(QueryBundle(query_str=query, embedding=query_embedding), top_k)
+
+    if not nodes:
+        return None
+
+    # 整合检索结果
+    results = []
+    for i, node in enumerate(nodes, 1):
+        content = node.node.get_content()
+        metadata = node.node.metadata
+        score = node.score if hasattr(node, 'score') else 0
+
+        # 提取文档来源
+        source = metadata.get('file_name', metadata.get('source', '未知来源'))
+
+        result_text = f"[文档{i}] 来源: {source} (相关度: {score:.4f})\n{content}"
+        results.append(result_text)
+
+    result = f"找到 {len(nodes)} 条相关应急处理文档：\n\n" + "\n\n".join(results)
+    _manuals_cache.set(top_k, query, result, embedding=query_embedding)
+    return result
+
+
 @tool
-def search_emergency_manuals(query: str, top_k: int = 3) -> str:
+async def search_emergency_manuals(query: str, top_k: int = 3) -> str:
     """
     从 Milvus 向量数据库中搜索相关的应急处理手册。
 
@@ -128,38 +159,13 @@ def search_emergency_manuals(query: str, top_k: int = 3) -> str:
         "找到以下相关应急文档：..."
     """
     try:
-        # 获取向量存储
-        vector_store = get_milvus_vector_store()
-
-        # 创建索引
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-
-        # 使用 retriever 检索相关文档
-        retriever = index.as_retriever(similarity_top_k=top_k)
-        nodes = retriever.retrieve(query)
-
-        if not nodes:
-            return "未找到相关的应急处理文档。"
-
-        # 整合检索结果
-        results = []
-        for i, node in enumerate(nodes, 1):
-            content = node.node.get_content()
-            metadata = node.node.metadata
-            score = node.score if hasattr(node, 'score') else 0
-
-            # 提取文档来源
-            source = metadata.get('file_name', metadata.get('source', '未知来源'))
-
-            result_text = f"[文档{i}] 来源: {source} (相关度: {score:.4f})\n{content}"
-            results.append(result_text)
-
-        return f"找到 {len(nodes)} 条相关应急处理文档：\n\n" + "\n\n".join(results)
-
+        result = await _retrieve_emergency_manuals(query, top_k)
     except Exception as e:
         logger.error(f"Milvus 查询失败: {e}")
         return f"查询应急手册时出错: {str(e)}"
 
+    return result or "未找到相关的应急处理文档。"
+
 
 # ============================================================
 # 请求/响应模型
@@ -197,23 +203,9 @@ class AlertResponse(BaseModel):
 # Agent 实现（观察-思考-行动循环）
 # ============================================================
 
-async def process_alert_with_agent(alert_message: str) -> AlertResponse:
-    """
-    使用 Agent 处理报警信息
-
-    流程：
-    1. 观察(Observation): 接收报警文本
-    2. 思考(Thought): LLM 判断是否需要调用工具
-    3. 行动(Action): 执行工具调用获取负责人信息和应急手册
-    4. 综合: 结合原始报警和工具结果生成检修建议
-    """
-    llm = get_llm(streaming=False)
-
-    # 定义工具列表
-    tools = [get_contact_phone, search_emergency_manuals]
-
-    # 定义系统提示
-    system_prompt = """你是一个智能报警处理助手，负责处理系统报警并生成检修建议。
+# 提示词定义为模块级常量：静态的系统提示始终位于消息序列最前面且逐字节不变，
+# 报警内容等变量只出现在其后的用户消息中，便于命中模型服务端的提示词前缀缓存
+AGENT_SYSTEM_PROMPT = """你是一个智能报警处理助手，负责处理系统报警并生成检修建议。
 
 当收到报警信息时：
 1. 分析报警中涉及的地点（如仓库、办公室、换衣间等）
@@ -230,11 +222,39 @@ async def process_alert_with_agent(alert_message: str) -> AlertResponse:
 
 请用专业但易懂的语言回复。"""
 
+ANALYSIS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """你是一个专业的运维检修顾问。请根据报警信息提供详细的检修建议。
+
+你的响应应该包括：
+1. 问题的紧急程度评估
+2. 可能的原因分析
+3. 具体的检修步骤和建议
+4. 安全注意事项
+
+请用专业但易懂的语言回复。"""),
+    ("user", """报警信息：{alert_message}
+{contact_section}
+{manuals_section}
+
+请根据以上信息提供检修建议。""")
+])
+
+
+async def _run_agent(alert_message: str, llm: Any) -> tuple[list[ToolCallResult], str, str, str]:
+    """
+    运行 Agent 的观察-思考-行动循环
+
+    Returns:
+        (工具调用记录, 负责人信息, 应急手册查询结果, 最终检修建议)
+    """
+    # 定义工具列表
+    tools = [get_contact_phone, search_emergency_manuals]
+
     # 使用 langchain 的 create_agent API (通常返回 CompiledGraph)
     agent = create_agent(
         model=llm,
         tools=tools,
-        system_prompt=system_prompt,
+        system_prompt=AGENT_SYSTEM_PROMPT,
         debug=False
     )
 
@@ -251,79 +271,118 @@ async def process_alert_with_agent(alert_message: str) -> AlertResponse:
         # 解析消息历史，提取工具调用和最终回复
         messages = result.get("messages", [])
         
-        # 临时映射：tool_call_id -> {name, args}
-        tool_calls_map = {}
+        # 单次遍历：AI 的工具调用请求总是先于对应的 ToolMessage 出现
+        # 临时映射：tool_call_id -> tool_call (包含 name, args)
+        pending_calls = {}
 
         for msg in messages:
-            # 1. 记录 AI 发出的工具调用请求 (AIMessage)
-            if isinstance(msg, AIMessage) and msg.tool_calls:
-                for tool_call in msg.tool_calls:
-                    call_id = tool_call.get("id")
-                    if call_id:
-                        tool_calls_map[call_id] = {
-                            "name": tool_call.get("name"),
-                            "args": tool_call.get("args")
-                        }
-
-            # 2. 记录工具执行结果 (ToolMessage)
-            if isinstance(msg, ToolMessage):
-                call_id = msg.tool_call_id
-                content = msg.content
-                
-                if call_id and call_id in tool_calls_map:
-                    call_info = tool_calls_map[call_id]
-                    tool_name = call_info["name"]
-                    tool_args = call_info["args"]
-                    
-                    tool_results.append(ToolCallResult(
-                        tool_name=tool_name,
-                        tool_input=tool_args,
-                        tool_output=str(content)
-                    ))
-
-                    # 提取联系信息
-                    if tool_name == "get_contact_phone":
-                        location = tool_args.get("location", "未知地点")
-                        contact_info = f"{location}负责人: {content}"
-                    
-                    # 提取应急手册结果
-                    elif tool_name == "search_emergency_manuals":
-                        emergency_manuals_result = str(content)
-                        # 如果内容太长，工具输出只展示一部分
-                        short_output = emergency_manuals_result[:200] + "..." if len(emergency_manuals_result) > 200 else emergency_manuals_result
-                        tool_results[-1].tool_output = short_output
-
-            # 3. 获取最终回复 (AIMessage)
-            if isinstance(msg, AIMessage) and not msg.tool_calls:
-                if msg.content and isinstance(msg.content, str):
+            if isinstance(msg, AIMessage):
+                # 1. 记录 AI 发出的工具调用请求
+                if msg.tool_calls:
+                    for tool_call in msg.tool_calls:
+                        call_id = tool_call.get("id")
+                        if call_id:
+                            pending_calls[call_id] = tool_call
+                # 3. 获取最终回复
+                elif msg.content and isinstance(msg.content, str):
                     final_suggestion = msg.content
 
+            # 2. 记录工具执行结果 (ToolMessage)，与对应的调用请求配对
+            elif isinstance(msg, ToolMessage):
+                tool_call = pending_calls.pop(msg.tool_call_id, None)
+                if tool_call is None:
+                    continue
+
+                tool_name = tool_call.get("name")
+                tool_args = tool_call.get("args")
+                tool_output = str(msg.content)
+
+                # 提取联系信息
+                if tool_name == "get_contact_phone":
+                    location = tool_args.get("location", "未知地点")
+                    contact_info = f"{location}负责人: {tool_output}"
+
+                # 提取应急手册结果
+                elif tool_name == "search_emergency_manuals":
+                    emergency_manuals_result = tool_output
+                    # 如果内容太长，工具输出只展示一部分 (在构建模型前截断，避免重复校验)
+                    if len(tool_output) > 200:
+                        tool_output = tool_output[:200] + "..."
+
+                tool_results.append(ToolCallResult(
+                    tool_name=tool_name,
+                    tool_input=tool_args,
+                    tool_output=tool_output
+                ))
+
     except Exception as e:
         logger.error(f"Agent 执行异常: {e}", exc_info=True)
 
-    # 如果 Agent 没有生成完整结果，补充生成检修建议
-    if not final_suggestion:
-        analysis_prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是一个专业的运维检修顾问。请根据报警信息提供详细的检修建议。
+    return tool_results, contact_info, emergency_manuals_result, final_suggestion
 
-你的响应应该包括：
-1. 问题的紧急程度评估
-2. 可能的原因分析
-3. 具体的检修步骤和建议
-4. 安全注意事项
 
-请用专业但易懂的语言回复。"""),
-            ("user", """报警信息：{alert_message}
-{contact_section}
-{manuals_section}
+async def _prefetch_alert_context(alert_message: str) -> tuple[list[ToolCallResult], str, str] | None:
+    """
+    基于规则的快速路径：报警文本中能直接识别出已知地点，且能检索到应急手册时，
+    无需 LLM 决策即可确定工具调用结果，返回 (工具调用记录, 负责人信息, 应急手册查询结果)；
+    否则返回 None，交由 Agent 处理。
+    """
+    location = detect_location(alert_message)
+    if location is None:
+        return None
+
+    try:
+        manuals = await _retrieve_emergency_manuals(alert_message)
+    except Exception as e:
+        logger.warning(f"快速路径检索应急手册失败，回退到 Agent: {e}")
+        return None
+    if not manuals:
+        return None
+
+    phone = CONTACT_PHONE_MAP[location]
+    tool_results = [
+        ToolCallResult(
+            tool_name="get_contact_phone",
+            tool_input={"location": location},
+            tool_output=phone
+        ),
+        ToolCallResult(
+            tool_name="search_emergency_manuals",
+            tool_input={"query": alert_message},
+            tool_output=manuals[:200] + "..." if len(manuals) > 200 else manuals
+        ),
+    ]
+    return tool_results, f"{location}负责人: {phone}", manuals
 
-请根据以上信息提供检修建议。""")
-        ])
 
+async def process_alert_with_agent(alert_message: str) -> AlertResponse:
+    """
+    使用 Agent 处理报警信息
+
+    流程：
+    0. 快速路径: 能从报警文本中直接识别地点并检索到应急手册时，跳过 Agent 决策
+    1. 观察(Observation): 接收报警文本
+    2. 思考(Thought): LLM 判断是否需要调用工具
+    3. 行动(Action): 执行工具调用获取负责人信息和应急手册
+    4. 综合: 结合原始报警和工具结果生成检修建议
+    """
+    llm = get_llm(streaming=False)
+
+    final_suggestion = ""
+
+    # 常见报警 (如"仓库着火") 直接由规则确定工具结果，只需一次 LLM 调用生成检修建议
+    prefetched = await _prefetch_alert_context(alert_message)
+    if prefetched is not None:
+        tool_results, contact_info, emergency_manuals_result = prefetched
+    else:
+        tool_results, contact_info, emergency_manuals_result, final_suggestion = await _run_agent(alert_message, llm)
+
+    # 如果 Agent 没有生成完整结果，补充生成检修建议
+    if not final_suggestion:
         contact_section = f"\n负责人信息：{contact_info}" if contact_info else ""
         manuals_section = f"\n应急手册参考：{emergency_manuals_result}" if emergency_manuals_result else ""
         
-        analysis_chain = analysis_prompt | llm | StrOutputParser()
+        analysis_chain = ANALYSIS_PROMPT | llm | StrOutputParser()
 
         final_suggestion = await analysis_chain.ainvoke({
             "alert_message": alert_message,
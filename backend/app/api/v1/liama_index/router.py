@@ -1,32 +1,51 @@
 
+import asyncio
+import atexit
+import functools
 import logging
-from typing import Any, List, Dict
+import os
+import shutil
+import time
+from typing import Any, AsyncIterator, List, Dict, Sequence
 
 from llama_index.core import (
     VectorStoreIndex, 
     Document, 
+    QueryBundle,
     StorageContext,
     Settings as LlamaSettings,
     SimpleDirectoryReader
 )
-import os
+from llama_index.core.base.response.schema import RESPONSE_TYPE, AsyncStreamingResponse
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
 import tempfile
-import json
 from pathlib import Path
-from fastapi import APIRouter, HTTPException, BackgroundTasks, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, BackgroundTasks, File, UploadFile, Form, Request
+from fastapi.responses import StreamingResponse
+import orjson
 from pydantic import BaseModel, Field
 
-# Pymilvus 2.x attempts to parse MILVUS_URI from environment on import.
-# If it's set to an invalid format (e.g. missing http scheme), it crashes.
-# We clear it here to ensure safe import; actual connection uses settings.MILVUS_URI.
-if "MILVUS_URI" in os.environ:
-    del os.environ["MILVUS_URI"]
-
-from llama_index.vector_stores.milvus import MilvusVectorStore
 from llama_index.llms.openai_like import OpenAILike
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.readers.file import DocxReader, PDFReader
+# 预加载 PDF / Word 解析依赖 (读取器内部按需导入)，避免首次上传时才付出导入开销
+import docx2txt  # noqa: F401
+import pypdf  # noqa: F401
 
+from app.core.ai.embedding import BatchingOpenAIEmbedding
+from app.core.ai.query_cache import QueryCache, invalidate_query_caches
+from app.core.ai.vector_store import (
+    MilvusException,
+    aretrieve,
+    get_milvus_client,
+    get_milvus_vector_store,
+    get_vector_index,
+    reset_vector_store,
+    retry_on_missing_collection,
+    search_kwargs,
+)
 from app.core.config import settings
+from app.core.process_pool import run_in_process_pool
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -37,29 +56,6 @@ router = APIRouter()
 # 初始化 LlamaIndex 设置 (Lazy Loading 推荐，但在 Demo 中直接初始化)
 # ============================================================
 
-def get_milvus_vector_store() -> MilvusVectorStore:
-    """获取 Milvus 向量存储实例"""
-    # 优先使用 URI (Zilliz Cloud)，其次使用 Host/Port (自建 Milvus)
-    if settings.MILVUS_URI:
-        return MilvusVectorStore(
-            uri=settings.MILVUS_URI,
-            token=settings.MILVUS_TOKEN,
-            collection_name=settings.MILVUS_COLLECTION,
-            dim=settings.LLAMAINDEX_EMBEDDING_DIM
-        )
-    elif settings.MILVUS_HOST:
-        # 自建 Milvus 连接
-        return MilvusVectorStore(
-            uri=f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
-            user=settings.MILVUS_USER,
-            password=settings.MILVUS_PASSWORD,
-            collection_name=settings.MILVUS_COLLECTION,
-            dim=settings.LLAMAINDEX_EMBEDDING_DIM,
-            overwrite=False # 默认不覆盖，避免误删数据
-        )
-    else:
-        raise HTTPException(status_code=500, detail="未配置 Milvus 连接信息 (URI 或 HOST/PORT)，请检查 .env 文件")
-
 def init_global_settings():
     """初始化 LlamaIndex 全局设置"""
     # 配置 LLM (使用智谱 GLM)
@@ -74,11 +70,15 @@ def init_global_settings():
     # 配置 Embedding (使用智谱 embedding-3)
     # 注意: Zhipu 的 embedding-3 需要兼容 OpenAI 接口
     # 使用 model_name 而不是 model 来绕过 OpenAIEmbeddingModelType 枚举检查
-    LlamaSettings.embed_model = OpenAIEmbedding(
+    # 并发请求的查询向量会在短时间窗口内合并为一次批量调用
+    LlamaSettings.embed_model = BatchingOpenAIEmbedding(
         model_name="embedding-3",
         api_key=settings.LLM_API_KEY,
         api_base=settings.LLM_BASE_URL,
-        dimensions=settings.LLAMAINDEX_EMBEDDING_DIM
+        dimensions=settings.LLAMAINDEX_EMBEDDING_DIM,
+        # 文档入库时每次 HTTP 请求携带的文本数，受服务商单次请求上限约束
+        embed_batch_size=settings.EMBED_BATCH_SIZE,
+        max_batch_size=settings.EMBED_BATCH_SIZE,
     )
 
 # 初始化全局配置
@@ -98,48 +98,109 @@ class IndexRequest(BaseModel):
 class QueryRequest(BaseModel):
     query: str = Field(..., description="查询问题")
     top_k: int = Field(default=3, description="返回的最相关结果数量")
+    stream: bool = Field(default=False, description="是否以 NDJSON 流式返回生成的回答")
 
 class SearchRequest(BaseModel):
     query: str = Field(..., description="搜索关键词")
     top_k: int = Field(default=3, description="返回的最相似文档数量")
+    stream: bool = Field(default=False, description="是否以 NDJSON 逐条流式返回检索结果")
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=32, description="搜索关键词列表")
+    top_k: int = Field(default=3, description="每个查询返回的最相似文档数量")
 
 class BaseResponse(BaseModel):
     success: bool
     message: str
     data: Any = None
 
+# 文档入库时每批写入 Milvus 的节点数
+INDEX_INSERT_BATCH_SIZE = 512
+
+# 支持上传索引的文件类型，及其对应的读取器 (读取器无状态，进程内复用)
+_ALLOWED_EXT: frozenset[str] = frozenset({".pdf", ".docx"})
+_FILE_EXTRACTORS = {".pdf": PDFReader(), ".docx": DocxReader()}
+
+@functools.cache
+def _get_upload_dir() -> str:
+    """进程内共享的上传临时目录 (首次使用时创建，进程退出时删除)"""
+    upload_dir = tempfile.mkdtemp(prefix="uploads_")
+    atexit.register(shutil.rmtree, upload_dir, ignore_errors=True)
+    return upload_dir
+
+# 文件解析为 CPU 密集型任务，放到共享进程池中执行，多个上传可在多核上并行解析而不受 GIL 限制
+def _parse_file(path: str, extra_info: Dict[str, Any]) -> List[Document]:
+    """使用 SimpleDirectoryReader 解析单个文件并合并元数据 (在子进程中执行)"""
+    loader = SimpleDirectoryReader(input_files=[path], file_extractor=_FILE_EXTRACTORS)
+    documents = loader.load_data()
+    # 确保所有字段都是 JSON 序列化的 (防止出现 bytes)：清理 llama-index 自动提取的元数据
+    # 中可能存在的 bytes，并在同一次遍历中合并用户提供的元数据 (用户元数据优先)
+    for doc in documents:
+        doc.metadata = {
+            k: v.decode("utf-8", errors="replace") if type(v) is bytes else v
+            for k, v in doc.metadata.items()
+        } | extra_info
+    return documents
+
+# 上传文件分块读取的大小 (1 MiB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 流式响应的媒体类型 (每行一个 JSON 对象)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# 健康检查结果的缓存时长 (秒) 与 LLM 探测超时 (秒)，避免频繁探活耗尽 LLM 配额
+HEALTH_CACHE_TTL = 10.0
+HEALTH_LLM_TIMEOUT = 2.0
+_last_health: Dict[str, Any] = {"ts": 0.0, "data": None}
+
+# /query 与 /search 的查询缓存 (精确匹配 + 语义匹配)
+_query_cache = QueryCache(max_size=512, ttl=300.0, similarity_threshold=0.97)
+
 # ============================================================
 # API 路由
 # ============================================================
 
 @router.get("/health", response_model=BaseResponse)
 async def health_check():
-    """LlamaIndex 与 Milvus 连接状态检查"""
+    """LlamaIndex 与 Milvus 连接状态检查 (结果缓存 HEALTH_CACHE_TTL 秒)"""
+    now = time.monotonic()
+    if _last_health["data"] is not None and now - _last_health["ts"] < HEALTH_CACHE_TTL:
+        return BaseResponse(
+            success=True,
+            message="Health check completed",
+            data=_last_health["data"]
+        )
+
     status_data = {
         "llm": "unknown",
         "milvus": "unknown"
     }
     
-    # 检查 LLM
+    # 检查 LLM (超时视为不可用，避免服务商卡顿时健康检查一直挂起)
     try:
-        resp = LlamaSettings.llm.complete("Hello")
+        await asyncio.wait_for(
+            asyncio.to_thread(LlamaSettings.llm.complete, "Hi"),
+            timeout=HEALTH_LLM_TIMEOUT
+        )
         status_data["llm"] = "connected"
+    except asyncio.TimeoutError:
+        status_data["llm"] = "timeout"
     except Exception as e:
         status_data["llm"] = f"error: {str(e)}"
         
-    # 检查 Milvus (通过尝试连接)
-    try:
-        store = get_milvus_vector_store()
-        # 简单检查 collection 是否存在并不是直接 API，但初始化 store 通常会尝试连接
-        # 我们这里假设能初始化成功即代表基本参数正确，真正的连接在操作时触发
-        # 为了更严谨，可以尝试 client.has_collection (在 store.client 中)
-        # 但 MilvusVectorStore 封装了 client，这里简单返回配置检查
-        if settings.MILVUS_URI:
-            status_data["milvus"] = "configured"
-        else:
-            status_data["milvus"] = "not_configured"
-    except Exception as e:
-        status_data["milvus"] = f"error: {str(e)}"
+    # 检查 Milvus (通过共享的 MilvusClient 查询 collection 是否存在)
+    if settings.MILVUS_URI or settings.MILVUS_HOST:
+        try:
+            client = await asyncio.to_thread(get_milvus_client)
+            await asyncio.to_thread(client.has_collection, settings.MILVUS_COLLECTION)
+            status_data["milvus"] = "connected"
+        except Exception as e:
+            status_data["milvus"] = f"error: {str(e)}"
+    else:
+        status_data["milvus"] = "not_configured"
+
+    _last_health["ts"] = now
+    _last_health["data"] = status_data
 
     return BaseResponse(
         success=True,
@@ -147,25 +208,33 @@ async def health_check():
         data=status_data
     )
 
-def _index_documents(documents: List[Document]):
-    """将文档列表索引到 Milvus 的通用逻辑"""
+def _index_documents(vector_store: BasePydanticVectorStore, documents: List[Document]) -> None:
+    """将文档列表索引到 Milvus 的通用逻辑 (MilvusException 交由全局异常处理器处理)"""
     try:
-        # 1. 获取向量存储
-        vector_store = get_milvus_vector_store()
-        
-        # 2. 创建存储上下文
+        # 1. 创建存储上下文
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
         
-        # 3. 构建索引 (会自动计算 embedding 并存入 Milvus)
+        # 2. 构建索引 (会自动计算 embedding 并存入 Milvus)
         VectorStoreIndex.from_documents(
             documents, 
-            storage_context=storage_context
+            storage_context=storage_context,
+            # 按批次计算 embedding 并写入 Milvus，而不是逐个节点处理
+            insert_batch_size=INDEX_INSERT_BATCH_SIZE,
+            show_progress=False
         )
-    except Exception as e:
+        
+        # 3. 索引数据已变化，清空查询缓存
+        invalidate_query_caches()
+    except (ConnectionError, TimeoutError) as e:
         error_msg = f"索引失败 (类型: {type(e).__name__}): {str(e)}"
         logger.error(error_msg)
         # 确保 detail 是纯字符串，避免编码问题
-        raise HTTPException(status_code=500, detail=error_msg)
+        raise HTTPException(status_code=503, detail=error_msg)
+
+async def _aindex_documents(documents: List[Document]) -> None:
+    """在事件循环线程中获取向量存储，embedding 计算与写入 Milvus 等阻塞操作放到线程中执行"""
+    vector_store = await get_milvus_vector_store()
+    await asyncio.to_thread(_index_documents, vector_store, documents)
 
 @router.post("/index", response_model=BaseResponse)
 async def index_document(request: IndexRequest):
@@ -173,8 +242,8 @@ async def index_document(request: IndexRequest):
     # 1. 创建文档对象
     doc = Document(text=request.text, extra_info=request.metadata)
     
-    # 2. 执行索引
-    _index_documents([doc])
+    # 2. 执行索引 (embedding 计算与写入 Milvus 均为阻塞操作，放到线程中执行)
+    await retry_on_missing_collection(lambda: _aindex_documents([doc]))
     
     return BaseResponse(
         success=True,
@@ -183,148 +252,265 @@ async def index_document(request: IndexRequest):
 
 @router.post("/index/file", response_model=BaseResponse)
 async def index_file(
+    request: Request,
     file: UploadFile = File(...),
     metadata: str = Form(None, description="可选的元数据，JSON 字符串格式")
 ):
     """上传 PDF 或 Word 文档并进行索引"""
+    # 先按 Content-Length 拒绝超大上传，不做任何解析与 embedding
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"上传文件不能超过 {settings.MAX_UPLOAD_BYTES} 字节")
+
     filename = file.filename
     ext = Path(filename).suffix.lower()
     
-    if ext not in [".pdf", ".docx"]:
+    if ext not in _ALLOWED_EXT:
         raise HTTPException(status_code=400, detail="目前仅支持 .pdf 和 .docx 格式的文件")
     
     # 解析元数据
     extra_info = {}
     if metadata:
         try:
-            extra_info = json.loads(metadata)
-        except json.JSONDecodeError:
+            extra_info = orjson.loads(metadata)
+        except orjson.JSONDecodeError:
             raise HTTPException(status_code=400, detail="metadata 必须是有效的 JSON 字符串")
     
     # 确保元数据中有文件名
     extra_info.setdefault("file_name", filename)
     
-    # 使用临时文件保存上传内容
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_file_path = Path(temp_dir) / filename
-        try:
-            with open(temp_file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            
-            # 使用 SimpleDirectoryReader 加载文档
-            loader = SimpleDirectoryReader(input_files=[str(temp_file_path)])
-            documents = loader.load_data()
-            
-            # 为加载的文档添加元数据，并确保所有字段都是 JSON 序列化的 (防止出现 bytes)
-            for doc in documents:
-                # 清理 llama-index 自动提取的元数据中可能存在的 bytes
-                clean_doc_metadata = {}
-                for k, v in doc.metadata.items():
-                    if isinstance(v, bytes):
-                        clean_doc_metadata[k] = v.decode("utf-8", errors="replace")
-                    else:
-                        clean_doc_metadata[k] = v
-                doc.metadata = clean_doc_metadata
-                # 合并用户提供的元数据
-                doc.metadata.update(extra_info)
-            
-            logger.info(f"正在索引文件: {filename}, 解析出 {len(documents)} 个片段")
-            
-            # 执行索引
-            _index_documents(documents)
-            
-            return BaseResponse(
-                success=True,
-                message=f"文件 '{filename}' 已成功解析并索引到 Milvus (共 {len(documents)} 个片段)"
-            )
-        except HTTPException:
-            raise
-        except Exception as e:
-            error_msg = f"文件处理失败 ({filename}): {str(e)}"
-            logger.error(error_msg)
-            raise HTTPException(status_code=500, detail=error_msg)
+    # 在共享的上传目录中创建临时文件，无需每次请求创建并删除目录
+    temp_file = tempfile.NamedTemporaryFile(suffix=ext, dir=_get_upload_dir(), delete=False)
+    temp_file_path = temp_file.name
+    try:
+        # 分块写入磁盘，内存占用与文件大小无关
+        with temp_file as f:
+            written = 0
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                # Content-Length 可能缺失或不准确，按实际写入字节数再次校验
+                written += len(chunk)
+                if written > settings.MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"上传文件不能超过 {settings.MAX_UPLOAD_BYTES} 字节")
+                f.write(chunk)
+        
+        # 在进程池中使用 SimpleDirectoryReader 加载文档，元数据清理与合并也在子进程中完成
+        documents = await run_in_process_pool(_parse_file, temp_file_path, extra_info)
+        
+        logger.info(f"正在索引文件: {filename}, 解析出 {len(documents)} 个片段")
+        
+        # 执行索引
+        await retry_on_missing_collection(lambda: _aindex_documents(documents))
+        
+        return BaseResponse(
+            success=True,
+            message=f"文件 '{filename}' 已成功解析并索引到 Milvus (共 {len(documents)} 个片段)"
+        )
+    except (HTTPException, MilvusException):
+        raise
+    except Exception as e:
+        error_msg = f"文件处理失败 ({filename}): {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        os.unlink(temp_file_path)
+
+def _source_nodes_data(source_nodes: Sequence[NodeWithScore]) -> List[Dict[str, Any]]:
+    """RAG 回答引用的来源片段 (截断展示)"""
+    return [
+        {
+            "score": node.score,
+            # 直接读取原始文本并先截断，不经过 get_content 的元数据模板拼接
+            "text": (node.text or "")[:200] + "..." # 截断展示
+        }
+        for node in source_nodes
+    ]
+
+def _ndjson_line(obj: Any) -> bytes:
+    return orjson.dumps(obj) + b"\n"
+
+async def _stream_cached_query(data: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """以流式格式返回缓存的查询结果，客户端无需区分是否命中缓存"""
+    yield _ndjson_line({"source_nodes": data["source_nodes"]})
+    yield _ndjson_line({"token": data["response"]})
+
+async def _aquery(
+    query_bundle: QueryBundle, top_k: int, streaming: bool = False
+) -> RESPONSE_TYPE:
+    """复用进程内缓存的索引创建查询引擎并执行查询 (collection 被其他进程删除时重建后重试)"""
+    async def _run() -> RESPONSE_TYPE:
+        index = await get_vector_index()
+        query_engine = index.as_query_engine(
+            similarity_top_k=top_k, streaming=streaming, **search_kwargs(top_k)
+        )
+        return await query_engine.aquery(query_bundle)
+
+    return await retry_on_missing_collection(_run)
+
+async def _stream_query(
+    query_bundle: QueryBundle,
+    top_k: int,
+    cache_namespace: tuple[str, int],
+    query_embedding: List[float],
+) -> AsyncIterator[bytes]:
+    """先返回来源片段，再随 LLM 生成逐个返回 token；完整生成后写入查询缓存"""
+    try:
+        response = await _aquery(query_bundle, top_k, streaming=True)
+        # 异步流式查询返回 AsyncStreamingResponse
+        assert isinstance(response, AsyncStreamingResponse)
+        source_nodes = _source_nodes_data(response.source_nodes)
+        yield _ndjson_line({"source_nodes": source_nodes})
+
+        tokens: List[str] = []
+        async for token in response.async_response_gen():
+            tokens.append(token)
+            yield _ndjson_line({"token": token})
+    except Exception as e:
+        # 响应头已发送，只能在流中返回错误
+        logger.error(f"流式查询失败: {e}")
+        yield _ndjson_line({"error": f"查询失败: {str(e)}"})
+        return
+
+    _query_cache.set(
+        cache_namespace,
+        query_bundle.query_str,
+        {"response": "".join(tokens), "source_nodes": source_nodes},
+        embedding=query_embedding,
+    )
 
 @router.post("/query", response_model=BaseResponse)
 async def query_index(request: QueryRequest):
-    """语义查询 (RAG)"""
+    """语义查询 (RAG)，stream=True 时以 NDJSON 流式返回回答"""
+    cache_namespace = ("query", request.top_k)
     try:
-        # 1. 连接现有索引
-        vector_store = get_milvus_vector_store()
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-        
-        # 2. 创建查询引擎
-        query_engine = index.as_query_engine(similarity_top_k=request.top_k)
+        # 1. 先查缓存：精确匹配，其次语义相近的历史查询
+        data = _query_cache.get(cache_namespace, request.query)
+        if data is None:
+            query_embedding = await LlamaSettings.embed_model.aget_query_embedding(request.query)
+            data = _query_cache.get_similar(cache_namespace, query_embedding)
+        if data is not None:
+            if request.stream:
+                return StreamingResponse(_stream_cached_query(data), media_type=NDJSON_MEDIA_TYPE)
+            return BaseResponse(success=True, message="查询成功", data=data)
+
+        # 2. 复用已计算的查询向量
+        query_bundle = QueryBundle(query_str=request.query, embedding=query_embedding)
+
+        # 流式模式：检索完成后立即开始返回 token，无需等待完整回答
+        if request.stream:
+            return StreamingResponse(
+                _stream_query(query_bundle, request.top_k, cache_namespace, query_embedding),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+
+        # 3. 执行查询 (异步接口)
+        response = await _aquery(query_bundle, request.top_k)
         
-        # 3. 执行查询
-        response = query_engine.query(request.query)
+        data = {
+            "response": str(response),
+            "source_nodes": _source_nodes_data(response.source_nodes)
+        }
+        _query_cache.set(cache_namespace, request.query, data, embedding=query_embedding)
         
         return BaseResponse(
             success=True,
             message="查询成功",
-            data={
-                "response": str(response),
-                "source_nodes": [
-                    {
-                        "score": node.score,
-                        "text": node.node.get_content()[:200] + "..." # 截断展示
-                    }
-                    for node in response.source_nodes
-                ]
-            }
+            data=data
         )
-    except Exception as e:
+    except (ConnectionError, TimeoutError) as e:
         logger.error(f"查询失败: {e}")
-        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"查询失败: {str(e)}")
+
+async def _search(query: str, top_k: int) -> List[Dict[str, Any]]:
+    """向量检索，命中查询缓存时不访问 Milvus"""
+    cache_namespace = ("search", top_k)
+    # 先查缓存：精确匹配，其次语义相近的历史查询
+    cached: List[Dict[str, Any]] | None = _query_cache.get(cache_namespace, query)
+    if cached is not None:
+        return cached
+    query_embedding = await LlamaSettings.embed_model.aget_query_embedding(query)
+    similar: List[Dict[str, Any]] | None = _query_cache.get_similar(cache_namespace, query_embedding)
+    if similar is not None:
+        return similar
+
+    # 使用缓存的 retriever 只做检索，不生成回答 (复用已计算的查询向量)
+    nodes = await aretrieve(QueryBundle(query_str=query, embedding=query_embedding), top_k)
+    
+    metadata_fields = settings.SEARCH_METADATA_FIELDS
+    results = [
+        {
+            "score": node.score,
+            "text": node.text,
+            # 配置了白名单时只返回客户端需要的元数据字段，减小响应体积
+            "metadata": (
+                {k: v for k, v in node.node.metadata.items() if k in metadata_fields}
+                if metadata_fields else node.node.metadata
+            )
+        }
+        for node in nodes
+    ]
+    _query_cache.set(cache_namespace, query, results, embedding=query_embedding)
+    return results
 
 @router.post("/search", response_model=BaseResponse)
 async def search_vector(request: SearchRequest):
-    """纯向量搜索 (Retriever 模式)"""
+    """纯向量搜索 (Retriever 模式)，stream=True 时以 NDJSON 每行返回一个结果"""
     try:
-        vector_store = get_milvus_vector_store()
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-        
-        # 使用 retriever 只做检索，不生成回答
-        retriever = index.as_retriever(similarity_top_k=request.top_k)
-        nodes = retriever.retrieve(request.query)
-        
-        results = [
-            {
-                "score": node.score,
-                "text": node.node.get_content(),
-                "metadata": node.node.metadata
-            }
-            for node in nodes
-        ]
+        results = await _search(request.query, request.top_k)
+
+        if request.stream:
+            # 逐条序列化输出，不必一次性编码整个结果列表
+            return StreamingResponse(
+                (_ndjson_line(result) for result in results),
+                media_type=NDJSON_MEDIA_TYPE
+            )
         
         return BaseResponse(
             success=True,
             message=f"找到 {len(results)} 个相关文档",
             data=results
         )
-    except Exception as e:
+    except (ConnectionError, TimeoutError) as e:
         logger.error(f"搜索失败: {e}")
-        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"搜索失败: {str(e)}")
+
+@router.post("/search/batch", response_model=BaseResponse)
+async def batch_search_vector(request: BatchSearchRequest):
+    """批量向量搜索：多个查询并发执行，总耗时取决于最慢的一个"""
+    try:
+        # 命中缓存的查询直接返回，其余查询并发检索，查询向量由 embedding 模型合并为批量请求
+        all_results = await asyncio.gather(
+            *(_search(query, request.top_k) for query in request.queries)
+        )
+        
+        return BaseResponse(
+            success=True,
+            message=f"完成 {len(request.queries)} 个查询",
+            data=[
+                {"query": query, "results": results}
+                for query, results in zip(request.queries, all_results, strict=True)
+            ]
+        )
+    except (ConnectionError, TimeoutError) as e:
+        logger.error(f"批量搜索失败: {e}")
+        raise HTTPException(status_code=503, detail=f"批量搜索失败: {str(e)}")
 
 @router.delete("/delete", response_model=BaseResponse)
 async def delete_collection():
     """删除索引数据 (Drop Collection)"""
     try:
-        # 注意: MilvusVectorStore 目前没有直接的 drop 方法暴露在顶层接口
-        # 但可以通过 client 属性访问
-        vector_store = get_milvus_vector_store()
-        
-        # 尝试清理数据
         # 警告: 这会删除整个 collection
-        if hasattr(vector_store, "client"):
-            # pymilvus client
-            if vector_store.client.has_collection(settings.MILVUS_COLLECTION):
-                vector_store.client.drop_collection(settings.MILVUS_COLLECTION)
+        client = await asyncio.to_thread(get_milvus_client)
+        if await asyncio.to_thread(client.has_collection, settings.MILVUS_COLLECTION):
+            await asyncio.to_thread(client.drop_collection, settings.MILVUS_COLLECTION)
+
+        # collection 已删除，丢弃缓存的连接、索引与查询结果，下次使用时重新创建
+        await reset_vector_store()
+        invalidate_query_caches()
                 
         return BaseResponse(
             success=True,
             message=f"集合 {settings.MILVUS_COLLECTION} 已删除"
         )
-    except Exception as e:
+    except (ConnectionError, TimeoutError) as e:
         logger.error(f"删除失败: {e}")
-        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"删除失败: {str(e)}")
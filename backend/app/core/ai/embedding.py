@@ -0,0 +1,58 @@
+import asyncio
+
+from llama_index.embeddings.openai import OpenAIEmbedding
+from pydantic import Field, PrivateAttr
+
+
+class BatchingOpenAIEmbedding(OpenAIEmbedding):
+    """
+    支持请求合并的 OpenAI 兼容 Embedding 模型。
+
+    并发的异步查询向量请求会先进入等待队列，在 batch_window 秒的时间窗口结束后
+    合并为一次批量 embedding 调用，再把结果分发给各个调用方，
+    从而把 N 次 HTTP 往返减少为 1 次。同步接口的行为保持不变。
+    """
+
+    batch_window: float = Field(default=0.01, description="合并请求的时间窗口 (秒)")
+    max_batch_size: int = Field(default=32, description="单次批量请求的最大文本数")
+
+    _pending: list[tuple[str, asyncio.Future[list[float]]]] = PrivateAttr(
+        default_factory=list
+    )
+    _flush_task: asyncio.Task[None] | None = PrivateAttr(default=None)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchingOpenAIEmbedding"
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[list[float]] = loop.create_future()
+        self._pending.append((query, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self) -> None:
+        """等待时间窗口结束后，按 max_batch_size 分批发送队列中的请求"""
+        await asyncio.sleep(self.batch_window)
+        batch, self._pending = self._pending, []
+        self._flush_task = None
+
+        for start in range(0, len(batch), self.max_batch_size):
+            chunk = batch[start : start + self.max_batch_size]
+            # 非旧版 (text-search-*) 模型的 query/text engine 相同，可直接复用批量接口
+            try:
+                embeddings = await self._aget_text_embeddings(
+                    [text for text, _ in chunk]
+                )
+                # 返回数量与请求不一致时 strict 会抛出 ValueError，整批失败而不是让部分请求永远挂起
+                results = list(zip(chunk, embeddings, strict=True))
+            except Exception as e:
+                for _, future in chunk:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), embedding in results:
+                if not future.done():
+                    future.set_result(embedding)
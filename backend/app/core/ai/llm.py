@@ -1,10 +1,25 @@
+import functools
 import os
+import httpx
+from langchain_core.caches import InMemoryCache
 from langchain_openai import ChatOpenAI
 from app.core.config import settings
 
+# 进程内精确匹配缓存：相同的消息序列与模型参数直接返回上次的生成结果
+_llm_cache = InMemoryCache(maxsize=settings.LLM_CACHE_MAX_SIZE) if settings.LLM_CACHE_MAX_SIZE > 0 else None
+
+# 所有 LLM 客户端共享的 HTTP 连接池：启用 HTTP/2 多路复用，并保持一定数量的空闲长连接
+_http_limits = httpx.Limits(max_keepalive_connections=20)
+_http_client = httpx.Client(http2=True, limits=_http_limits)
+_http_async_client = httpx.AsyncClient(http2=True, limits=_http_limits)
+
+@functools.lru_cache(maxsize=8)
 def get_llm(streaming: bool = False) -> ChatOpenAI:
     """
     获取初始化后的 LangChain LLM 客户端。
+
+    客户端按参数缓存并在请求间复用，底层 HTTP 连接池保持长连接，
+    避免每次调用都重新建立 TCP/TLS 连接。
     
     Args:
         streaming: 是否启用流式输出。默认为 False。
@@ -18,4 +33,7 @@ def get_llm(streaming: bool = False) -> ChatOpenAI:
         openai_api_base=settings.LLM_BASE_URL,
         streaming=streaming,
         temperature=0.1,  # 默认采样温度
+        cache=_llm_cache,
+        http_client=_http_client,
+        http_async_client=_http_async_client,
     )
@@ -0,0 +1,128 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Hashable, Sequence
+from typing import Any, NamedTuple
+
+import numpy as np
+
+# 所有 QueryCache 实例，索引数据变化时统一失效
+_caches: "weakref.WeakSet[QueryCache]" = weakref.WeakSet()
+
+
+class _CacheEntry(NamedTuple):
+    value: Any
+    created_at: float
+    embedding: np.ndarray | None
+
+
+class QueryCache:
+    """
+    线程安全的 LRU + TTL 查询缓存。
+
+    支持两级查找：
+    - get: 按 (namespace, query) 精确匹配
+    - get_similar: 在同一 namespace 最近写入的条目中，按查询向量的余弦相似度匹配
+
+    namespace 用于区分影响结果的其他参数 (如接口类型、top_k)，语义匹配只在同一 namespace 内进行。
+    """
+
+    def __init__(
+        self,
+        max_size: int = 256,
+        ttl: float | None = 300.0,
+        similarity_threshold: float = 0.97,
+        max_similarity_candidates: int = 64,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_similarity_candidates = max_similarity_candidates
+        self._entries: OrderedDict[tuple[Hashable, str], _CacheEntry] = OrderedDict()
+        self._lock = threading.RLock()
+        _caches.add(self)
+
+    def _is_expired(self, entry: _CacheEntry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created_at > self.ttl
+
+    def get(self, namespace: Hashable, query: str) -> Any | None:
+        """精确匹配查找，命中时移到最近使用位置"""
+        key = (namespace, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry, time.monotonic()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_similar(
+        self, namespace: Hashable, embedding: Sequence[float]
+    ) -> Any | None:
+        """语义匹配查找：返回相似度不低于阈值且最相似的缓存结果"""
+        now = time.monotonic()
+        with self._lock:
+            keys: list[tuple[Hashable, str]] = []
+            vectors: list[np.ndarray] = []
+            # 从最近写入/使用的条目开始扫描，最多扫描 max_similarity_candidates 个
+            for key in reversed(self._entries):
+                entry = self._entries[key]
+                if (
+                    key[0] != namespace
+                    or entry.embedding is None
+                    or self._is_expired(entry, now)
+                ):
+                    continue
+                keys.append(key)
+                vectors.append(entry.embedding)
+                if len(keys) >= self.max_similarity_candidates:
+                    break
+            if not keys:
+                return None
+
+            similarities = np.stack(vectors) @ _normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            key = keys[best]
+            self._entries.move_to_end(key)
+            return self._entries[key].value
+
+    def set(
+        self,
+        namespace: Hashable,
+        query: str,
+        value: Any,
+        embedding: Sequence[float] | None = None,
+    ) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        key = (namespace, query)
+        entry = _CacheEntry(
+            value=value,
+            created_at=time.monotonic(),
+            embedding=_normalize(embedding) if embedding is not None else None,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def invalidate_query_caches() -> None:
+    """清空所有查询缓存 (索引写入或删除后调用，避免返回过期结果)"""
+    for cache in list(_caches):
+        cache.clear()
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
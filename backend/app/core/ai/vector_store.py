@@ -0,0 +1,237 @@
+import functools
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from typing import Any, TypeVar
+
+from fastapi import HTTPException
+
+# Pymilvus 2.x attempts to parse MILVUS_URI from environment on import.
+# If it's set to an invalid format (e.g. missing http scheme), it crashes.
+# We clear it here to ensure safe import; actual connection uses settings.MILVUS_URI.
+if "MILVUS_URI" in os.environ:
+    del os.environ["MILVUS_URI"]
+
+# MilvusException 供其他模块从这里导入，确保 pymilvus 在上面清理 MILVUS_URI 环境变量之后才被加载
+from llama_index.core import QueryBundle, VectorStoreIndex
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.vector_stores.milvus import MilvusVectorStore
+from pymilvus import MilvusClient
+from pymilvus import MilvusException as MilvusException
+from pymilvus.exceptions import CollectionNotExistException, ErrorCode
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 进程内共享的向量存储、索引与 retriever，复用底层 Milvus 连接
+# 只能在事件循环线程中创建 (不能放到 asyncio.to_thread 中)：MilvusVectorStore 构造时会创建
+# AsyncMilvusClient，后者要求当前线程存在运行中的事件循环。创建过程中没有 await，无需加锁
+_vector_store: MilvusVectorStore | None = None
+_vector_index: VectorStoreIndex | None = None
+_retrievers: dict[int, BaseRetriever] = {}
+# 按 top_k 缓存的 retriever 数量上限
+_RETRIEVER_CACHE_SIZE = 8
+
+
+async def get_milvus_vector_store() -> MilvusVectorStore:
+    """获取 Milvus 向量存储实例 (首次调用时创建，之后复用)"""
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = _create_milvus_vector_store()
+    return _vector_store
+
+
+def _index_kwargs() -> dict[str, Any]:
+    """根据配置生成向量索引与检索参数，避免默认配置下的暴力检索"""
+    index_type = settings.MILVUS_INDEX_TYPE
+    metric_type = settings.MILVUS_METRIC_TYPE
+    if index_type == "HNSW":
+        return {
+            "similarity_metric": metric_type,
+            "index_config": {
+                "index_type": "HNSW",
+                "metric_type": metric_type,
+                "params": {
+                    "M": settings.MILVUS_HNSW_M,
+                    "efConstruction": settings.MILVUS_HNSW_EF_CONSTRUCTION,
+                },
+            },
+            "search_config": {"params": {"ef": settings.MILVUS_HNSW_EF}},
+        }
+    if index_type == "IVF_PQ":
+        return {
+            "similarity_metric": metric_type,
+            "index_config": {
+                "index_type": "IVF_PQ",
+                "metric_type": metric_type,
+                "params": {
+                    "nlist": settings.MILVUS_IVF_NLIST,
+                    "m": settings.MILVUS_PQ_M,
+                },
+            },
+            "search_config": {"params": {"nprobe": settings.MILVUS_IVF_NPROBE}},
+        }
+    return {"similarity_metric": metric_type}
+
+
+def _create_milvus_vector_store() -> MilvusVectorStore:
+    # 优先使用 URI (Zilliz Cloud)，其次使用 Host/Port (自建 Milvus)
+    if settings.MILVUS_URI:
+        return MilvusVectorStore(
+            uri=settings.MILVUS_URI,
+            token=settings.MILVUS_TOKEN,
+            collection_name=settings.MILVUS_COLLECTION,
+            dim=settings.LLAMAINDEX_EMBEDDING_DIM,
+            **_index_kwargs(),
+        )
+    elif settings.MILVUS_HOST:
+        # 自建 Milvus 连接
+        return MilvusVectorStore(
+            uri=f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
+            user=settings.MILVUS_USER,
+            password=settings.MILVUS_PASSWORD,
+            collection_name=settings.MILVUS_COLLECTION,
+            dim=settings.LLAMAINDEX_EMBEDDING_DIM,
+            overwrite=False,  # 默认不覆盖，避免误删数据
+            **_index_kwargs(),
+        )
+    else:
+        raise HTTPException(
+            status_code=500,
+            detail="未配置 Milvus 连接信息 (URI 或 HOST/PORT)，请检查 .env 文件",
+        )
+
+
+# 共享 MilvusClient 的连接别名，与向量存储使用的连接相互独立
+_SHARED_CLIENT_ALIAS = "app-shared-milvus-client"
+
+
+@functools.lru_cache(maxsize=1)
+def get_milvus_client() -> MilvusClient:
+    """
+    获取进程内共享的 MilvusClient，用于 collection 管理、健康检查等不依赖 LlamaIndex 的操作。
+
+    与 get_milvus_vector_store 不同，这里不会自动创建 collection。
+    使用独立的连接别名：pymilvus 默认按 uri + 认证信息生成别名，同配置的客户端会共用同一连接，
+    reset_vector_store 关闭向量存储的客户端时会连带断开这里的连接。
+    """
+    if settings.MILVUS_URI:
+        return MilvusClient(
+            uri=settings.MILVUS_URI,
+            token=settings.MILVUS_TOKEN,
+            alias=_SHARED_CLIENT_ALIAS,
+        )
+    elif settings.MILVUS_HOST:
+        return MilvusClient(
+            uri=f"http://{settings.MILVUS_HOST}:{settings.MILVUS_PORT}",
+            user=settings.MILVUS_USER,
+            password=settings.MILVUS_PASSWORD,
+            alias=_SHARED_CLIENT_ALIAS,
+        )
+    else:
+        raise HTTPException(
+            status_code=500,
+            detail="未配置 Milvus 连接信息 (URI 或 HOST/PORT)，请检查 .env 文件",
+        )
+
+
+def close_milvus_client() -> None:
+    """关闭共享的 MilvusClient (进程退出时调用)"""
+    if get_milvus_client.cache_info().currsize:
+        try:
+            get_milvus_client().close()
+        except Exception as e:
+            logger.warning(f"关闭 Milvus 连接失败: {e}")
+    get_milvus_client.cache_clear()
+
+
+async def get_vector_index() -> VectorStoreIndex:
+    """获取基于 Milvus 的索引 (进程内只构建一次)"""
+    global _vector_index
+    if _vector_index is None:
+        vector_store = await get_milvus_vector_store()
+        _vector_index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+    return _vector_index
+
+
+def search_kwargs(top_k: int) -> dict[str, Any]:
+    """
+    按 top_k 生成检索参数，传给 as_retriever / as_query_engine。
+
+    HNSW 要求 ef 不小于返回条数，top_k 大于配置的 ef 时按 top_k 放大，否则 Milvus 会拒绝检索。
+    """
+    if settings.MILVUS_INDEX_TYPE == "HNSW" and top_k > settings.MILVUS_HNSW_EF:
+        return {
+            "vector_store_kwargs": {"milvus_search_config": {"params": {"ef": top_k}}}
+        }
+    return {}
+
+
+async def get_retriever(top_k: int) -> BaseRetriever:
+    """按 top_k 缓存 retriever，避免每次请求都重建索引与检索器"""
+    retriever = _retrievers.get(top_k)
+    if retriever is None:
+        index = await get_vector_index()
+        retriever = index.as_retriever(similarity_top_k=top_k, **search_kwargs(top_k))
+        if len(_retrievers) >= _RETRIEVER_CACHE_SIZE:
+            _retrievers.pop(next(iter(_retrievers)))
+        _retrievers[top_k] = retriever
+    return retriever
+
+
+async def reset_vector_store() -> None:
+    """关闭并丢弃缓存的向量存储、索引与 retriever (如 collection 被删除后)，下次使用时重新创建"""
+    global _vector_store, _vector_index
+    store, _vector_store = _vector_store, None
+    _vector_index = None
+    _retrievers.clear()
+    if store is None:
+        return
+    # 同步与异步客户端各自持有一条 gRPC 连接，都要关闭，否则每次重建都会泄漏一条连接
+    try:
+        store.client.close()
+    except Exception as e:
+        logger.warning(f"关闭 Milvus 连接失败: {e}")
+    try:
+        await store.aclient.close()
+    except Exception as e:
+        logger.warning(f"关闭 Milvus 异步连接失败: {e}")
+
+
+def _is_collection_missing(exc: MilvusException) -> bool:
+    return (
+        isinstance(exc, CollectionNotExistException)
+        or exc.code == ErrorCode.COLLECTION_NOT_FOUND
+    )
+
+
+async def retry_on_missing_collection(call: Callable[[], Awaitable[T]]) -> T:
+    """
+    执行依赖缓存向量存储的操作，collection 不存在时重建向量存储并重试一次。
+
+    多 worker 部署时 /delete 只会重置处理该请求的进程内的缓存，
+    其他进程缓存的向量存储仍指向已删除的 collection；重建时会重新创建 collection。
+    call 需要在内部重新获取向量存储/索引/retriever，重试时才能拿到新的实例。
+    """
+    try:
+        return await call()
+    except MilvusException as e:
+        if not _is_collection_missing(e):
+            raise
+        logger.warning(f"Milvus collection 不存在，重建向量存储后重试: {e}")
+        await reset_vector_store()
+        return await call()
+
+
+async def aretrieve(query_bundle: QueryBundle, top_k: int) -> list[NodeWithScore]:
+    """使用缓存的 retriever 异步检索"""
+
+    async def _retrieve() -> list[NodeWithScore]:
+        retriever = await get_retriever(top_k)
+        return await retriever.aretrieve(query_bundle)
+
+    return await retry_on_missing_collection(_retrieve)
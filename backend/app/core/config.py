@@ -74,11 +74,29 @@ class Settings(BaseSettings):
     MILVUS_TOKEN: str = ""
     MILVUS_COLLECTION: str = "llamaindex_demo"
     LLAMAINDEX_EMBEDDING_DIM: int = 2048
+    # 向量索引参数 (仅在创建 collection 时生效)
+    # MILVUS_INDEX_TYPE: HNSW / IVF_PQ (千万级以上向量，量化压缩内存) / AUTOINDEX (Zilliz Cloud)
+    MILVUS_INDEX_TYPE: Literal["HNSW", "IVF_PQ", "AUTOINDEX"] = "HNSW"
+    MILVUS_METRIC_TYPE: Literal["IP", "L2", "COSINE"] = "IP"
+    MILVUS_HNSW_M: int = 16
+    MILVUS_HNSW_EF_CONSTRUCTION: int = 200
+    MILVUS_HNSW_EF: int = 64
+    MILVUS_IVF_NLIST: int = 4096
+    MILVUS_IVF_NPROBE: int = 16
+    MILVUS_PQ_M: int = 64
+    # /search 返回的元数据字段白名单，为空时返回全部元数据
+    SEARCH_METADATA_FIELDS: list[str] = []
+    # 单次 embedding 请求的最大文本数，需根据服务商的限制调整
+    EMBED_BATCH_SIZE: int = 64
+    # 上传索引文件的大小上限 (字节)，超出时返回 413
+    MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024
 
     # LLM
     LLM_MODEL_ID: str = "gpt-3.5-turbo"
     LLM_API_KEY: str = ""
     LLM_BASE_URL: str = ""
+    # LLM 响应精确匹配缓存的最大条目数，设为 0 关闭缓存
+    LLM_CACHE_MAX_SIZE: int = 1000
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -0,0 +1,13 @@
+# 进程池子进程中执行的 PDF 解析函数
+# 单独成模块且只依赖 PyMuPDF：forkserver/spawn 子进程按模块路径导入任务函数，
+# 放在路由模块中会让每个子进程都导入 FastAPI、LangChain 与 LLM 客户端，首个任务要多等数秒
+import pymupdf
+
+
+def extract_pdf_pages(content: bytes, start: int, stop: int) -> str:
+    """提取 [start, stop) 页的文本 (在子进程中执行)"""
+    pdf_doc = pymupdf.open(stream=content, filetype="pdf")
+    try:
+        return "\n".join(pdf_doc[i].get_text("text") for i in range(start, stop))
+    finally:
+        pdf_doc.close()
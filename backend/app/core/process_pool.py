@@ -0,0 +1,66 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import forkserver
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# 不使用 fork：父进程中已有 gRPC、httpx 连接池与线程池等线程，fork 出的子进程可能继承被持有的锁而死锁
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+if _MP_CONTEXT.get_start_method() == "forkserver":
+    # 在 forkserver 中预先导入子进程任务所在的模块 (如 PyMuPDF)，之后 fork 出的子进程直接继承，
+    # 不必在每个子进程中重复导入
+    _MP_CONTEXT.set_forkserver_preload(["app.core.pdf"])
+
+# 进程内共享的 CPU 密集型任务 (文档解析等) 进程池，所有路由共用，避免每个 worker 创建多个进程池
+_process_pool: ProcessPoolExecutor | None = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """获取共享进程池 (首次调用时创建)"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=_MP_CONTEXT
+            )
+        return _process_pool
+
+
+def discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    丢弃已损坏的进程池，下次调用 get_process_pool 时重新创建。
+
+    子进程异常退出 (如解析恶意 PDF 时段错误或 OOM) 后进程池会进入 BrokenProcessPool 状态，
+    不重建的话之后的所有任务都会失败。
+    """
+    global _process_pool
+    with _process_pool_lock:
+        # 其他线程可能已经重建了进程池，只丢弃传入的这一个
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up_process_pool() -> None:
+    """启动 forkserver 并完成预导入 (应用启动时调用)，避免由第一个需要进程池的请求承担冷启动开销"""
+    if _MP_CONTEXT.get_start_method() == "forkserver":
+        forkserver.ensure_running()
+
+
+async def run_in_process_pool(func: Callable[..., T], *args: Any) -> T:
+    """在共享进程池中执行 func (需为模块级函数，参数可 pickle)"""
+    pool = get_process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        discard_process_pool(pool)
+        raise
@@ -1,10 +1,24 @@
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.core.ai.vector_store import (
+    MilvusException,
+    close_milvus_client,
+    get_vector_index,
+    reset_vector_store,
+)
 from app.core.config import settings
+from app.core.process_pool import warm_up_process_pool
+
+logger = logging.getLogger(__name__)
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,12 +28,43 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # 提前启动进程池的 forkserver 并导入 PyMuPDF 等依赖，第一个大 PDF 请求无需等待子进程冷启动
+    warm_up_process_pool()
+    # 启动时预先建立 Milvus 连接并构建索引，避免由第一个请求承担连接开销
+    if settings.MILVUS_URI or settings.MILVUS_HOST:
+        try:
+            await get_vector_index()
+        except Exception as e:
+            logger.warning(f"Milvus 索引预热失败，将在首次请求时重试: {e}")
+    yield
+    await reset_vector_store()
+    close_milvus_client()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    # 使用 orjson 序列化响应，比标准库 json 更快
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+
+@app.exception_handler(MilvusException)
+async def milvus_exception_handler(
+    _request: Request, exc: MilvusException
+) -> ORJSONResponse:
+    # 统一处理各接口抛出的 Milvus 异常，接口内无需重复记录日志并转换为 HTTPException
+    logger.error(f"Milvus 操作失败: {exc}")
+    return ORJSONResponse(
+        status_code=503, content={"detail": f"Milvus 操作失败: {exc}"}
+    )
+
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
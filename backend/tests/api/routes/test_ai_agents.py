@@ -0,0 +1,172 @@
+import asyncio
+import io
+import zipfile
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pymupdf
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.ai_agents import router as ai_agents_router
+from app.api.v1.ai_agents.router import (
+    _PDF_PARALLEL_MIN_PAGES,
+    _batched,
+    _parse_docx,
+    _parse_pdf,
+)
+from app.core.config import settings
+from app.main import app
+
+TRANSLATE_URL = f"{settings.API_V1_STR}/v1/ai-agents/translate"
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _make_docx(document_xml: str) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("word/document.xml", document_xml)
+    buffer.seek(0)
+    return buffer
+
+
+def _make_pdf(*pages: str) -> bytes:
+    pdf_doc = pymupdf.open()
+    for text in pages:
+        pdf_doc.new_page().insert_text((72, 72), text)
+    try:
+        return pdf_doc.tobytes()
+    finally:
+        pdf_doc.close()
+
+
+def test_parse_docx_joins_paragraph_text() -> None:
+    document_xml = (
+        f'<w:document xmlns:w="{W_NS}"><w:body>'
+        "<w:p><w:r><w:t>Hello, </w:t></w:r><w:r><w:t>world</w:t></w:r></w:p>"
+        "<w:p><w:r><w:t>第二段</w:t></w:r></w:p>"
+        "</w:body></w:document>"
+    )
+    text = _parse_docx(_make_docx(document_xml))
+    assert text == "Hello, world\n第二段\n"
+
+
+def test_parse_docx_does_not_resolve_external_entities(tmp_path: Path) -> None:
+    secret = tmp_path / "secret.txt"
+    secret.write_text("top-secret-value")
+    document_xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<!DOCTYPE doc [<!ENTITY x SYSTEM "{secret.as_uri()}">]>'
+        f'<w:document xmlns:w="{W_NS}"><w:body>'
+        "<w:p><w:r><w:t>before &x; after</w:t></w:r></w:p>"
+        "</w:body></w:document>"
+    )
+    text = _parse_docx(_make_docx(document_xml))
+    assert "top-secret-value" not in text
+    assert "before" in text
+
+
+def test_parse_pdf_concurrent_calls_return_their_own_text() -> None:
+    contents = [_make_pdf(f"document {i}", f"page two of {i}") for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        texts = list(executor.map(_parse_pdf, contents * 4))
+    for i, text in enumerate(texts):
+        assert f"document {i % 8}" in text
+        assert f"page two of {i % 8}" in text
+
+
+def test_parse_pdf_splits_large_documents_across_processes() -> None:
+    pages = [f"page {i}" for i in range(_PDF_PARALLEL_MIN_PAGES + 5)]
+    text = _parse_pdf(_make_pdf(*pages))
+    assert [line for line in text.splitlines() if line] == pages
+
+
+async def _stream(*items: str | float) -> AsyncIterator[str]:
+    """按顺序产出字符串片段，数字表示在此处暂停的秒数"""
+    for item in items:
+        if isinstance(item, str):
+            yield item
+        else:
+            await asyncio.sleep(item)
+
+
+def _collect(stream: AsyncIterator[str]) -> list[str]:
+    async def run() -> list[str]:
+        return [chunk async for chunk in stream]
+
+    return asyncio.run(run())
+
+
+def test_batched_flushes_when_size_reached() -> None:
+    chunks = _collect(_batched(_stream("abc", "def", "ghi"), max_chars=6, max_delay=10))
+    assert chunks == ["abcdef", "ghi"]
+
+
+def test_batched_flushes_after_delay() -> None:
+    chunks = _collect(
+        _batched(_stream("a", "b", 0.3, "c"), max_chars=64, max_delay=0.05)
+    )
+    assert chunks == ["ab", "c"]
+
+
+def test_batched_empty_stream() -> None:
+    assert _collect(_batched(_stream(), max_chars=6)) == []
+
+
+class _FakeTranslateChain:
+    """替代流式翻译链，按片段输出 "[目标语言] 原文" 并记录调用"""
+
+    def __init__(self) -> None:
+        self.calls: list[dict[str, str]] = []
+
+    async def astream(self, inputs: dict[str, str]) -> AsyncIterator[str]:
+        self.calls.append(inputs)
+        for piece in (f"[{inputs['target_language']}] ", inputs["text"]):
+            yield piece
+
+
+@pytest.fixture
+def translate_chain(monkeypatch: pytest.MonkeyPatch) -> _FakeTranslateChain:
+    chain = _FakeTranslateChain()
+    monkeypatch.setattr(ai_agents_router, "_get_translate_chain", lambda: chain)
+    monkeypatch.setattr(ai_agents_router, "_translation_cache", OrderedDict())
+    return chain
+
+
+def _translate(client: TestClient, text: str, target_language: str) -> str:
+    r = client.post(
+        TRANSLATE_URL, json={"text": text, "target_language": target_language}
+    )
+    assert r.status_code == 200
+    return r.text
+
+
+def test_translate_serves_repeated_requests_from_cache(
+    translate_chain: _FakeTranslateChain,
+) -> None:
+    client = TestClient(app)
+    assert _translate(client, "你好", "English") == "[English] 你好"
+    assert _translate(client, "你好", "English") == "[English] 你好"
+    assert len(translate_chain.calls) == 1
+
+    # 目标语言不同时单独缓存
+    assert _translate(client, "你好", "日本語") == "[日本語] 你好"
+    assert len(translate_chain.calls) == 2
+
+
+def test_translate_cache_evicts_least_recently_used(
+    translate_chain: _FakeTranslateChain, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ai_agents_router, "_TRANSLATION_CACHE_MAX_SIZE", 2)
+    client = TestClient(app)
+    _translate(client, "一", "English")
+    _translate(client, "二", "English")
+    _translate(client, "一", "English")  # 命中缓存，"一" 成为最近使用
+    _translate(client, "三", "English")  # 超出容量，淘汰最久未使用的 "二"
+    assert [call["text"] for call in translate_chain.calls] == ["一", "二", "三"]
+
+    _translate(client, "一", "English")
+    _translate(client, "二", "English")
+    assert [call["text"] for call in translate_chain.calls] == ["一", "二", "三", "二"]
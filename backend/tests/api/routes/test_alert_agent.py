@@ -0,0 +1,97 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models import FakeListChatModel
+
+from app.api.v1.alert_agent import router as alert_agent
+from app.api.v1.alert_agent.router import detect_location, search_emergency_manuals
+from app.core.config import settings
+from app.main import app
+from tests.utils.llm import stub_llama_settings
+from tests.utils.milvus import (
+    FakeMilvusClient,
+    make_query_result,
+    stub_milvus,
+    stub_milvus_search,
+)
+
+
+def test_detect_location_maps_synonym_to_standard_name() -> None:
+    assert detect_location("库房发生火灾，请立即处理") == "仓库"
+    assert detect_location("IDC机房温度过高") == "机房"
+
+
+def test_detect_location_returns_none_when_unknown() -> None:
+    assert detect_location("停车场有可疑人员") is None
+
+
+def test_detect_location_prefers_longest_match() -> None:
+    # 同时包含 "更衣室" (换衣间) 与更长的 "生产车间"，按长度优先应命中 "生产车间"
+    assert detect_location("生产车间更衣室冒烟") == "生产车间"
+
+
+@pytest.fixture
+def milvus(monkeypatch: pytest.MonkeyPatch) -> list[FakeMilvusClient]:
+    clients = stub_milvus(monkeypatch)
+    stub_llama_settings(monkeypatch)
+    alert_agent._manuals_cache.clear()
+    return clients
+
+
+def test_search_emergency_manuals_retrieves_from_milvus(
+    milvus: list[FakeMilvusClient], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    queries = stub_milvus_search(
+        monkeypatch, make_query_result("切断电源后使用干粉灭火器")
+    )
+
+    async def run() -> tuple[str, str]:
+        first = await search_emergency_manuals.ainvoke({"query": "仓库着火"})
+        # 语义相同的查询命中缓存，不再访问 Milvus
+        second = await search_emergency_manuals.ainvoke({"query": "仓库失火了"})
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert "切断电源后使用干粉灭火器" in first
+    assert "doc-0.pdf" in first
+    assert second == first
+    assert queries == ["仓库着火"]
+    assert len(milvus) == 1
+
+
+@pytest.mark.usefixtures("milvus")
+def test_alert_with_known_location_skips_the_agent(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    stub_milvus_search(monkeypatch, make_query_result("切断电源后使用干粉灭火器"))
+    monkeypatch.setattr(
+        alert_agent,
+        "get_llm",
+        lambda **_kwargs: FakeListChatModel(responses=["立即疏散并灭火"]),
+    )
+
+    async def run_agent(*_args: Any) -> None:
+        raise AssertionError("识别出地点时不应调用 Agent")
+
+    monkeypatch.setattr(alert_agent, "_run_agent", run_agent)
+
+    with TestClient(app) as client:
+        r = client.post(
+            f"{settings.API_V1_STR}/v1/alert-agent/alert",
+            json={"alert_message": "库房着火了"},
+        )
+
+    assert r.status_code == 200
+    data = r.json()
+    assert data["maintenance_suggestion"] == "立即疏散并灭火"
+    assert (
+        data["contact_info"] == f"仓库负责人: {alert_agent.CONTACT_PHONE_MAP['仓库']}"
+    )
+    assert "切断电源后使用干粉灭火器" in data["emergency_manuals"]
+    assert [call["tool_name"] for call in data["tool_calls"]] == [
+        "get_contact_phone",
+        "search_emergency_manuals",
+    ]
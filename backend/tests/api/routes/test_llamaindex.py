@@ -0,0 +1,338 @@
+import asyncio
+import importlib
+import json
+import os
+import time
+from collections.abc import Generator
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from llama_index.core.llms import CompletionResponse, MockLLM
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from pymilvus import AsyncMilvusClient
+from pymilvus.exceptions import (
+    CollectionNotExistException,
+    ConnectionConfigException,
+    ErrorCode,
+    MilvusException,
+)
+
+from app.core.ai import vector_store
+from app.core.ai.query_cache import invalidate_query_caches
+from app.core.config import settings
+from app.main import app
+from tests.utils.llm import HashEmbedding, stub_llama_settings
+from tests.utils.milvus import (
+    FakeMilvusClient,
+    make_query_result,
+    stub_milvus,
+    stub_milvus_search,
+)
+
+LLAMAINDEX_URL = f"{settings.API_V1_STR}/v1/llamaindex"
+# 包的 __init__ 把 router 导出为 APIRouter 对象，按模块路径取得路由模块本身
+liama_index_router = importlib.import_module("app.api.v1.liama_index.router")
+
+
+@pytest.fixture
+def milvus(monkeypatch: pytest.MonkeyPatch) -> list[FakeMilvusClient]:
+    clients = stub_milvus(monkeypatch)
+    stub_llama_settings(
+        monkeypatch, HashEmbedding(embed_dim=settings.LLAMAINDEX_EMBEDDING_DIM)
+    )
+    invalidate_query_caches()
+    return clients
+
+
+@pytest.fixture
+def client(milvus: list[FakeMilvusClient]) -> Generator[TestClient, None, None]:  # noqa: ARG001
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.mark.usefixtures("milvus")
+def test_vector_store_cannot_be_created_in_worker_thread() -> None:
+    # MilvusVectorStore 内部的 AsyncMilvusClient 需要运行中的事件循环
+    with pytest.raises(ConnectionConfigException):
+        asyncio.run(asyncio.to_thread(vector_store._create_milvus_vector_store))
+
+
+def test_index_creates_vector_store_on_event_loop(
+    client: TestClient, milvus: list[FakeMilvusClient]
+) -> None:
+    r = client.post(
+        f"{LLAMAINDEX_URL}/index",
+        json={"text": "仓库着火时先切断电源", "metadata": {"source": "manual"}},
+    )
+    assert r.status_code == 200
+    assert r.json()["success"] is True
+    assert len(milvus) == 1
+    [row] = milvus[0].rows
+    assert row["source"] == "manual"
+
+
+def test_search_and_query_reuse_vector_store(
+    client: TestClient,
+    milvus: list[FakeMilvusClient],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    queries = stub_milvus_search(monkeypatch, make_query_result("使用干粉灭火器"))
+
+    r = client.post(f"{LLAMAINDEX_URL}/search", json={"query": "仓库着火", "top_k": 1})
+    assert r.status_code == 200
+    [result] = r.json()["data"]
+    assert result["text"] == "使用干粉灭火器"
+
+    r = client.post(f"{LLAMAINDEX_URL}/query", json={"query": "机房断电", "top_k": 1})
+    assert r.status_code == 200
+    assert r.json()["data"]["source_nodes"][0]["text"].startswith("使用干粉灭火器")
+
+    assert queries == ["仓库着火", "机房断电"]
+    assert len(milvus) == 1
+
+
+def test_lifespan_warms_up_and_closes_vector_store(
+    milvus: list[FakeMilvusClient], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    closed_async_clients: list[AsyncMilvusClient] = []
+
+    async def close(self: AsyncMilvusClient) -> None:
+        closed_async_clients.append(self)
+
+    monkeypatch.setattr(AsyncMilvusClient, "close", close)
+
+    with TestClient(app):
+        # 启动时已在事件循环线程中预热向量存储
+        store = vector_store._vector_store
+        assert store is not None
+        assert len(milvus) == 1
+
+    assert vector_store._vector_store is None
+    assert milvus[0].closed
+    assert closed_async_clients == [store.aclient]
+
+
+def _echo_results(query: VectorStoreQuery) -> VectorStoreQueryResult:
+    return make_query_result(
+        *(f"{query.query_str}-{i}" for i in range(query.similarity_top_k))
+    )
+
+
+def test_batch_search_keeps_query_order_and_partitions_cache_by_top_k(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    queries = stub_milvus_search(monkeypatch, _echo_results)
+    batch = ["仓库着火", "机房漏水", "食堂停电"]
+
+    r = client.post(
+        f"{LLAMAINDEX_URL}/search/batch", json={"queries": batch, "top_k": 1}
+    )
+    assert r.status_code == 200
+    data = r.json()["data"]
+    assert [item["query"] for item in data] == batch
+    assert [[res["text"] for res in item["results"]] for item in data] == [
+        [f"{query}-0"] for query in batch
+    ]
+    assert sorted(queries) == sorted(batch)
+
+    # 相同查询与 top_k 命中缓存；不同 top_k 的结果单独缓存，需要重新检索
+    queries.clear()
+    r = client.post(
+        f"{LLAMAINDEX_URL}/search/batch",
+        json={"queries": ["机房漏水", "仓库着火"], "top_k": 1},
+    )
+    assert [item["query"] for item in r.json()["data"]] == ["机房漏水", "仓库着火"]
+    assert queries == []
+
+    r = client.post(
+        f"{LLAMAINDEX_URL}/search/batch", json={"queries": ["仓库着火"], "top_k": 2}
+    )
+    [item] = r.json()["data"]
+    assert [res["text"] for res in item["results"]] == ["仓库着火-0", "仓库着火-1"]
+    assert queries == ["仓库着火"]
+
+
+@pytest.fixture
+def small_upload_limit(monkeypatch: pytest.MonkeyPatch) -> int:
+    async def fail_parse(*_args: Any, **_kwargs: Any) -> None:
+        raise AssertionError("超限的上传不应被解析")
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(liama_index_router, "run_in_process_pool", fail_parse)
+    return settings.MAX_UPLOAD_BYTES
+
+
+def test_index_file_rejects_content_length_over_limit(
+    client: TestClient, milvus: list[FakeMilvusClient], small_upload_limit: int
+) -> None:
+    r = client.post(
+        f"{LLAMAINDEX_URL}/index/file",
+        files={"file": ("big.pdf", b"x" * (small_upload_limit * 4), "application/pdf")},
+    )
+    assert r.status_code == 413
+    assert all(not c.rows for c in milvus)
+    assert os.listdir(liama_index_router._get_upload_dir()) == []
+
+
+def test_index_file_rejects_streamed_body_over_limit(
+    client: TestClient, milvus: list[FakeMilvusClient], small_upload_limit: int
+) -> None:
+    # 生成器请求体以 chunked 方式发送，没有 Content-Length，需按实际写入字节数拒绝
+    boundary = "upload-boundary"
+    body = [
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="big.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n".encode(),
+        *(b"x" * small_upload_limit for _ in range(4)),
+        f"\r\n--{boundary}--\r\n".encode(),
+    ]
+    r = client.post(
+        f"{LLAMAINDEX_URL}/index/file",
+        content=iter(body),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert r.status_code == 413
+    assert all(not c.rows for c in milvus)
+    assert os.listdir(liama_index_router._get_upload_dir()) == []
+
+
+@pytest.fixture
+def health(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """重置健康检查缓存并记录 LLM 探测调用，返回探测 prompt 列表"""
+    prompts: list[str] = []
+
+    def complete(_self: MockLLM, prompt: str, **_kwargs: Any) -> CompletionResponse:
+        prompts.append(prompt)
+        return CompletionResponse(text="ok")
+
+    monkeypatch.setattr(MockLLM, "complete", complete)
+    monkeypatch.setattr(liama_index_router, "_last_health", {"ts": 0.0, "data": None})
+    monkeypatch.setattr(
+        liama_index_router, "get_milvus_client", lambda: FakeMilvusClient()
+    )
+    return prompts
+
+
+def test_health_check_is_cached_for_ttl(client: TestClient, health: list[str]) -> None:
+    for _ in range(3):
+        r = client.get(f"{LLAMAINDEX_URL}/health")
+        assert r.status_code == 200
+        assert r.json()["data"] == {"llm": "connected", "milvus": "connected"}
+    assert len(health) == 1
+
+    # 缓存过期后重新探测
+    liama_index_router._last_health["ts"] -= liama_index_router.HEALTH_CACHE_TTL
+    client.get(f"{LLAMAINDEX_URL}/health")
+    assert len(health) == 2
+
+
+@pytest.mark.usefixtures("health")
+def test_health_check_reports_llm_timeout(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def slow_complete(_self: MockLLM, _prompt: str, **_kwargs: Any) -> None:
+        time.sleep(0.5)
+
+    monkeypatch.setattr(MockLLM, "complete", slow_complete)
+    monkeypatch.setattr(liama_index_router, "HEALTH_LLM_TIMEOUT", 0.05)
+
+    start = time.monotonic()
+    r = client.get(f"{LLAMAINDEX_URL}/health")
+    assert time.monotonic() - start < 0.5
+    assert r.json()["data"] == {"llm": "timeout", "milvus": "connected"}
+
+
+def _ndjson(r: httpx.Response) -> list[dict[str, Any]]:
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert r.text.endswith("\n")
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_query_stream_returns_source_nodes_then_tokens(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stub_milvus_search(monkeypatch, make_query_result("仓库着火时先切断电源"))
+    payload = {"query": "仓库着火怎么办", "top_k": 1, "stream": True}
+
+    lines = _ndjson(client.post(f"{LLAMAINDEX_URL}/query", json=payload))
+    assert lines[0] == {
+        "source_nodes": [{"score": 0.9, "text": "仓库着火时先切断电源..."}]
+    }
+    assert len(lines) > 2
+    assert all(line.keys() == {"token"} for line in lines[1:])
+    answer = "".join(line["token"] for line in lines[1:])
+    assert answer
+
+    # 命中缓存时以相同的格式返回，完整回答放在一行 token 中
+    cached = _ndjson(client.post(f"{LLAMAINDEX_URL}/query", json=payload))
+    assert cached == [lines[0], {"token": answer}]
+
+
+def test_search_stream_returns_one_result_per_line(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    stub_milvus_search(monkeypatch, make_query_result("切断电源", "疏散人员"))
+
+    r = client.post(
+        f"{LLAMAINDEX_URL}/search",
+        json={"query": "仓库着火", "top_k": 2, "stream": True},
+    )
+    lines = _ndjson(r)
+    assert [line["text"] for line in lines] == ["切断电源", "疏散人员"]
+    assert [line["metadata"]["file_name"] for line in lines] == [
+        "doc-0.pdf",
+        "doc-1.pdf",
+    ]
+
+
+def test_search_rebuilds_vector_store_when_collection_is_missing(
+    client: TestClient,
+    milvus: list[FakeMilvusClient],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # 模拟 collection 已被其他 worker 删除：第一次检索失败，重建向量存储后成功
+    def results(query: VectorStoreQuery) -> VectorStoreQueryResult:
+        if len(queries) == 1:
+            raise MilvusException(
+                code=ErrorCode.COLLECTION_NOT_FOUND, message="collection not found"
+            )
+        return make_query_result(f"{query.query_str}-0")
+
+    queries = stub_milvus_search(monkeypatch, results)
+    clients_before = len(milvus)
+
+    r = client.post(f"{LLAMAINDEX_URL}/search", json={"query": "仓库着火", "top_k": 1})
+    assert r.status_code == 200
+    assert [res["text"] for res in r.json()["data"]] == ["仓库着火-0"]
+    assert queries == ["仓库着火", "仓库着火"]
+    assert len(milvus) == clients_before + 1
+    assert milvus[-2].closed
+    assert not milvus[-1].closed
+
+
+def test_index_rebuilds_vector_store_when_collection_is_missing(
+    client: TestClient,
+    milvus: list[FakeMilvusClient],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    insert = FakeMilvusClient.insert
+
+    def insert_once_missing(
+        self: FakeMilvusClient, collection_name: str, data: Any, **kwargs: Any
+    ) -> None:
+        if self is milvus[0]:
+            raise CollectionNotExistException(message="collection not found")
+        insert(self, collection_name, data, **kwargs)
+
+    monkeypatch.setattr(FakeMilvusClient, "insert", insert_once_missing)
+
+    r = client.post(f"{LLAMAINDEX_URL}/index", json={"text": "仓库着火时先切断电源"})
+    assert r.status_code == 200
+    assert len(milvus) == 2
+    assert milvus[0].closed
+    assert [row["text"] for row in milvus[1].rows] == ["仓库着火时先切断电源"]
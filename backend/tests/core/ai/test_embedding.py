@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app.core.ai.embedding import BatchingOpenAIEmbedding
+
+
+def _make_model(**kwargs: object) -> BatchingOpenAIEmbedding:
+    return BatchingOpenAIEmbedding(api_key="test-key", **kwargs)
+
+
+def test_concurrent_queries_are_merged_into_batches(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: list[list[str]] = []
+
+    async def fake_embeddings(
+        _self: BatchingOpenAIEmbedding, texts: list[str]
+    ) -> list[list[float]]:
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(
+        BatchingOpenAIEmbedding, "_aget_text_embeddings", fake_embeddings
+    )
+    model = _make_model(batch_window=0.01, max_batch_size=2)
+    queries = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    async def run() -> list[list[float]]:
+        return await asyncio.gather(*(model._aget_query_embedding(q) for q in queries))
+
+    results = asyncio.run(run())
+
+    # 每个调用方拿到自己文本对应的向量
+    assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    # 5 个并发请求按 max_batch_size 拆成 3 次批量调用
+    assert calls == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+
+
+def test_batch_error_is_propagated_to_every_caller(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fake_embeddings(
+        _self: BatchingOpenAIEmbedding, texts: list[str]
+    ) -> list[list[float]]:
+        if "bad" in texts:
+            raise RuntimeError("embedding service unavailable")
+        return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(
+        BatchingOpenAIEmbedding, "_aget_text_embeddings", fake_embeddings
+    )
+    model = _make_model(batch_window=0.01, max_batch_size=2)
+
+    async def run() -> list[object]:
+        return await asyncio.gather(
+            *(model._aget_query_embedding(q) for q in ["ok", "bad", "fine"]),
+            return_exceptions=True,
+        )
+
+    first, second, third = asyncio.run(run())
+
+    # 失败只影响出错的那一批，其他批次正常返回
+    assert isinstance(first, RuntimeError)
+    assert isinstance(second, RuntimeError)
+    assert third == [1.0]
+
+
+def test_mismatched_batch_size_fails_instead_of_hanging(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fake_embeddings(
+        _self: BatchingOpenAIEmbedding, texts: list[str]
+    ) -> list[list[float]]:
+        return [[1.0]] * (len(texts) - 1)
+
+    monkeypatch.setattr(
+        BatchingOpenAIEmbedding, "_aget_text_embeddings", fake_embeddings
+    )
+    model = _make_model(batch_window=0.01)
+
+    async def run() -> list[object]:
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(model._aget_query_embedding(q) for q in ["a", "b"]),
+                return_exceptions=True,
+            ),
+            timeout=5,
+        )
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
@@ -0,0 +1,99 @@
+import pytest
+
+from app.core.ai import query_cache
+from app.core.ai.query_cache import QueryCache, invalidate_query_caches
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    fake = _Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", fake)
+    return fake
+
+
+def test_get_returns_cached_value() -> None:
+    cache = QueryCache()
+    cache.set("search", "仓库着火", ["result"])
+    assert cache.get("search", "仓库着火") == ["result"]
+    assert cache.get("search", "机房断电") is None
+
+
+def test_entries_expire_after_ttl(clock: _Clock) -> None:
+    cache = QueryCache(ttl=10.0)
+    cache.set("search", "q", "value", embedding=[1.0, 0.0])
+
+    clock.now += 10.0
+    assert cache.get("search", "q") == "value"
+
+    clock.now += 0.1
+    assert cache.get_similar("search", [1.0, 0.0]) is None
+    assert cache.get("search", "q") is None
+
+
+def test_ttl_none_never_expires(clock: _Clock) -> None:
+    cache = QueryCache(ttl=None)
+    cache.set("search", "q", "value")
+    clock.now += 1e9
+    assert cache.get("search", "q") == "value"
+
+
+def test_evicts_least_recently_used() -> None:
+    cache = QueryCache(max_size=2)
+    cache.set("search", "a", 1)
+    cache.set("search", "b", 2)
+    # 访问 a 后，b 成为最久未使用的条目
+    assert cache.get("search", "a") == 1
+    cache.set("search", "c", 3)
+
+    assert cache.get("search", "b") is None
+    assert cache.get("search", "a") == 1
+    assert cache.get("search", "c") == 3
+
+
+def test_namespaces_are_isolated() -> None:
+    cache = QueryCache()
+    cache.set(("search", 3), "q", "top3", embedding=[1.0, 0.0])
+
+    assert cache.get(("search", 5), "q") is None
+    assert cache.get_similar(("search", 5), [1.0, 0.0]) is None
+    assert cache.get(("search", 3), "q") == "top3"
+
+
+def test_get_similar_respects_threshold() -> None:
+    cache = QueryCache(similarity_threshold=0.9)
+    cache.set("search", "q", "value", embedding=[1.0, 0.0])
+
+    # cos ≈ 0.995，超过阈值
+    assert cache.get_similar("search", [1.0, 0.1]) == "value"
+    # cos ≈ 0.707，低于阈值
+    assert cache.get_similar("search", [1.0, 1.0]) is None
+    # 未存储向量的条目不参与语义匹配
+    cache.set("search", "plain", "no-embedding")
+    assert cache.get_similar("search", [0.0, 1.0]) is None
+
+
+def test_get_similar_returns_best_match() -> None:
+    cache = QueryCache(similarity_threshold=0.5)
+    cache.set("search", "far", "far", embedding=[1.0, 1.0])
+    cache.set("search", "near", "near", embedding=[1.0, 0.05])
+    cache.set("search", "latest", "latest", embedding=[0.0, 1.0])
+    assert cache.get_similar("search", [1.0, 0.0]) == "near"
+
+
+def test_invalidate_query_caches_clears_all_instances() -> None:
+    first, second = QueryCache(), QueryCache()
+    first.set("search", "q", 1)
+    second.set("query", "q", 2)
+
+    invalidate_query_caches()
+
+    assert first.get("search", "q") is None
+    assert second.get("query", "q") is None
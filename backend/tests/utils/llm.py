@@ -0,0 +1,46 @@
+import zlib
+
+import pytest
+from llama_index.core import MockEmbedding
+from llama_index.core import Settings as LlamaSettings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.llms import MockLLM
+
+from app.core.config import settings
+
+
+class HashEmbedding(MockEmbedding):
+    """相同文本得到相同的向量，不同文本得到 (几乎总是) 正交的向量，用于测试按查询区分的缓存"""
+
+    def _vector_for(self, text: str) -> list[float]:
+        vector = [0.0] * self.embed_dim
+        vector[zlib.crc32(text.encode("utf-8")) % self.embed_dim] = 1.0
+        return vector
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return self._vector_for(text)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._vector_for(query)
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._vector_for(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._vector_for(text)
+
+
+def stub_llama_settings(
+    monkeypatch: pytest.MonkeyPatch, embed_model: BaseEmbedding | None = None
+) -> None:
+    """
+    把 LlamaIndex 全局的 LLM 与 Embedding 模型替换为不访问网络的 Mock 实现。
+
+    默认的 MockEmbedding 对所有文本返回相同的向量，任意两个查询都会命中语义缓存。
+    """
+    monkeypatch.setattr(
+        LlamaSettings,
+        "_embed_model",
+        embed_model or MockEmbedding(embed_dim=settings.LLAMAINDEX_EMBEDDING_DIM),
+    )
+    monkeypatch.setattr(LlamaSettings, "_llm", MockLLM())
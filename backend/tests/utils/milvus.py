@@ -0,0 +1,101 @@
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.vector_stores.milvus import MilvusVectorStore, base
+from pymilvus import MilvusClient
+
+from app.core.ai import vector_store
+from app.core.config import settings
+
+
+class FakeMilvusClient:
+    """替代 MilvusVectorStore 内部的同步 MilvusClient，不访问真实的 Milvus"""
+
+    create_schema = staticmethod(MilvusClient.create_schema)
+    prepare_index_params = staticmethod(MilvusClient.prepare_index_params)
+
+    def __init__(self, **_kwargs: Any) -> None:
+        self._using = "fake"
+        self.collections: list[str] = []
+        self.rows: list[dict[str, Any]] = []
+        self.closed = False
+
+    def list_collections(self) -> list[str]:
+        return self.collections
+
+    def has_collection(self, collection_name: str, **_kwargs: Any) -> bool:
+        return collection_name in self.collections
+
+    def create_collection(self, collection_name: str, **_kwargs: Any) -> None:
+        self.collections.append(collection_name)
+
+    def insert(
+        self, _collection_name: str, data: list[dict[str, Any]], **_kwargs: Any
+    ) -> None:
+        self.rows.extend(data)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def make_query_result(*texts: str) -> VectorStoreQueryResult:
+    nodes = [
+        TextNode(id_=f"node-{i}", text=text, metadata={"file_name": f"doc-{i}.pdf"})
+        for i, text in enumerate(texts)
+    ]
+    return VectorStoreQueryResult(
+        nodes=nodes,
+        similarities=[0.9 - i * 0.1 for i in range(len(texts))],
+        ids=[node.id_ for node in nodes],
+    )
+
+
+def stub_milvus(monkeypatch: pytest.MonkeyPatch) -> list[FakeMilvusClient]:
+    """
+    用 FakeMilvusClient 替换 MilvusVectorStore 的同步客户端并清空缓存的向量存储。
+
+    AsyncMilvusClient 保持真实实现：它在没有运行中事件循环的线程里创建会直接报错，
+    测试可以据此发现在工作线程中构建向量存储的问题。返回已创建的假客户端列表。
+    """
+    clients: list[FakeMilvusClient] = []
+
+    def make_client(**kwargs: Any) -> FakeMilvusClient:
+        client = FakeMilvusClient(**kwargs)
+        clients.append(client)
+        return client
+
+    monkeypatch.setattr(base, "MilvusClient", make_client)
+    monkeypatch.setattr(base, "Collection", lambda *_args, **_kwargs: object())
+    monkeypatch.setattr(settings, "MILVUS_URI", "")
+    monkeypatch.setattr(settings, "MILVUS_HOST", "localhost")
+    monkeypatch.setattr(vector_store, "_vector_store", None)
+    monkeypatch.setattr(vector_store, "_vector_index", None)
+    monkeypatch.setattr(vector_store, "_retrievers", {})
+    return clients
+
+
+def stub_milvus_search(
+    monkeypatch: pytest.MonkeyPatch,
+    result: VectorStoreQueryResult
+    | Callable[[VectorStoreQuery], VectorStoreQueryResult],
+) -> list[str]:
+    """
+    让 MilvusVectorStore.aquery 返回固定结果 (或按查询调用 result 生成结果)，
+    返回每次检索的查询文本
+    """
+    queries: list[str] = []
+
+    async def aquery(
+        _self: MilvusVectorStore, query: VectorStoreQuery, **_kwargs: Any
+    ) -> VectorStoreQueryResult:
+        queries.append(query.query_str or "")
+        return result(query) if callable(result) else result
+
+    monkeypatch.setattr(MilvusVectorStore, "aquery", aquery)
+    return queries